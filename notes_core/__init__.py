@@ -0,0 +1,6 @@
+"""Shared data access for the note-taking apps
+
+``notes_core.db`` owns the schema, pooled connections and every query;
+``notes_core.api`` holds the FastAPI routes built on it (and is the only
+module that needs FastAPI).
+"""
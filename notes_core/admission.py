@@ -0,0 +1,162 @@
+"""Admission control and load shedding for the API
+
+Each /api/notes request falls into a lane with its own concurrency limit
+and bounded wait queue:
+
+    lookup   GET of a single note or the stats - the priority lane
+    scan     GET /api/notes, which may read the whole table
+    write    POST, PUT and DELETE
+
+Point lookups have slots of their own, so a burst of full scans cannot
+starve get_note. A request that finds its lane full waits in the queue
+for up to NOTES_ADMISSION_TIMEOUT seconds; if the queue is full or the
+wait runs out it is shed straight away with 503 and a Retry-After header
+instead of piling up behind SQLite.
+
+Lanes are sized with "concurrency:queue" values, e.g.
+NOTES_ADMISSION_SCAN=4:8. NOTES_ADMISSION=0 turns admission control off.
+
+    app.add_middleware(AdmissionMiddleware)
+"""
+import asyncio
+import collections
+import os
+
+from starlette.responses import JSONResponse
+
+from . import tracing
+
+ENABLED = os.environ.get("NOTES_ADMISSION", "1") != "0"
+
+# Longest a request waits for a slot, in seconds
+TIMEOUT = float(os.environ.get("NOTES_ADMISSION_TIMEOUT", "2"))
+
+# Seconds clients are told to wait after a 503
+RETRY_AFTER = int(os.environ.get("NOTES_ADMISSION_RETRY_AFTER", "1"))
+
+# Default (concurrency, queue size) per lane
+LANE_SIZES = {
+    "lookup": (16, 64),
+    "scan": (4, 8),
+    "write": (2, 32),
+}
+
+
+def _lane_size(name):
+    value = os.environ.get(f"NOTES_ADMISSION_{name.upper()}")
+    if not value:
+        return LANE_SIZES[name]
+    limit, queue_size = value.split(":")
+    return int(limit), int(queue_size)
+
+
+def route_lane(method, path):
+    """Name of the lane for a request, or None if it is not limited"""
+    if not path.startswith("/api/notes"):
+        return None
+    if method not in ("GET", "HEAD"):
+        return "write"
+    if path.rstrip("/") == "/api/notes":
+        return "scan"
+    return "lookup"
+
+
+class Lane:
+    """A concurrency limit with a bounded FIFO wait queue"""
+
+    def __init__(self, name, limit, queue_size):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.active = 0
+        self.waiters = collections.deque()
+        self.admitted = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    async def acquire(self, timeout):
+        """Take a slot; return False if the request should be shed"""
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            self.admitted += 1
+            return True
+        if len(self.waiters) >= self.queue_size:
+            self.shed += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait((waiter,), timeout=timeout)
+        except asyncio.CancelledError:
+            if waiter.done():
+                self.release()
+            else:
+                waiter.cancel()
+                self.waiters.remove(waiter)
+            raise
+        if waiter.done():
+            self.admitted += 1
+            return True
+        waiter.cancel()
+        self.waiters.remove(waiter)
+        self.shed += 1
+        self.timed_out += 1
+        return False
+
+    def release(self):
+        """Hand the slot to the next waiter, or free it"""
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def metrics(self):
+        return {
+            "limit": self.limit,
+            "queue_size": self.queue_size,
+            "active": self.active,
+            "queued": len(self.waiters),
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+        }
+
+
+lanes = {name: Lane(name, *_lane_size(name)) for name in LANE_SIZES}
+
+
+def metrics():
+    """Queue depth and admission counters per lane"""
+    return {"enabled": ENABLED, "lanes": {name: lane.metrics() for name, lane in lanes.items()}}
+
+
+class AdmissionMiddleware:
+    """ASGI middleware admitting or shedding requests per lane"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        name = ENABLED and scope["type"] == "http" and route_lane(scope["method"], scope["path"])
+        if not name:
+            await self.app(scope, receive, send)
+            return
+
+        lane = lanes[name]
+        with tracing.span("admission wait", lane=name):
+            admitted = await lane.acquire(TIMEOUT)
+        if not admitted:
+            response = JSONResponse(
+                {"detail": f"Server busy ({name} requests), retry later"},
+                status_code=503,
+                headers={"Retry-After": str(RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lane.release()
@@ -0,0 +1,428 @@
+"""FastAPI routes for the notes REST API
+
+Shared by alpine/main.py and the deploy backends, which add their own
+CORS settings and page routes around it:
+
+    app = FastAPI(lifespan=create_lifespan(DATABASE_URL))
+    app.include_router(create_router(DATABASE_URL))
+
+The database is initialised in that lifespan rather than at import, and
+the connection pool is warmed in the background once the app is
+accepting requests.
+"""
+from contextlib import asynccontextmanager, suppress
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, UploadFile
+from fastapi.responses import FileResponse, Response
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from starlette.background import BackgroundTask
+from typing import Optional, List
+import asyncio
+import logging
+import os
+import secrets
+import shutil
+import sqlite3
+import tempfile
+import time
+import zipfile
+
+from . import admission, backup, db, importer, maintenance, singleflight, tracing
+
+_imported_at = time.perf_counter()
+
+logger = logging.getLogger(__name__)
+
+# Required in the X-Admin-Token header of admin routes; unset disables them
+ADMIN_TOKEN = os.environ.get("NOTES_ADMIN_TOKEN")
+
+# Pooled connections opened and primed in the background at startup
+WARM_CONNECTIONS = int(os.environ.get("NOTES_WARM_CONNECTIONS", "2"))
+
+# Reject /api/notes requests that do not name a user
+REQUIRE_USER = os.environ.get("NOTES_REQUIRE_USER", "0") == "1"
+
+
+# Pydantic models
+class NoteCreate(BaseModel):
+    note_name: str
+    note_description: Optional[str] = ""
+    note_url: Optional[str] = ""
+    note_comment: Optional[str] = ""
+
+class NoteUpdate(BaseModel):
+    note_name: Optional[str] = None
+    note_description: Optional[str] = None
+    note_url: Optional[str] = None
+    note_comment: Optional[str] = None
+
+class Note(BaseModel):
+    id: int
+    note_name: str
+    note_description: Optional[str]
+    note_url: Optional[str]
+    note_comment: Optional[str]
+    created_at: str
+    updated_at: str
+    created_by: str
+    updated_by: str
+
+class NotePreview(Note):
+    description_truncated: bool = False
+    comment_truncated: bool = False
+
+NOTE_PREVIEWS = TypeAdapter(List[NotePreview])
+
+class NoteStats(BaseModel):
+    total_notes: int
+    with_url: int
+    with_description: int
+    last_updated: Optional[str]
+
+class ImportLineError(BaseModel):
+    line: int
+    error: str
+
+class ImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: List[ImportLineError]
+
+
+class BackupStatus(BaseModel):
+    id: str
+    target: str
+    archive_target: Optional[str]
+    status: str
+    pages_total: Optional[int]
+    pages_remaining: Optional[int]
+    percent_done: Optional[float]
+    started_at: float
+    finished_at: Optional[float]
+    error: Optional[str]
+
+
+class MaintenanceReport(BaseModel):
+    started_at: float
+    seconds: float
+    auto_vacuum: str
+    pages_before: int
+    pages_after: int
+    pages_reclaimed: int
+    bytes_reclaimed: int
+    free_pages_left: int
+    archive_pages_before: int
+    archive_pages_after: int
+    archive_pages_reclaimed: int
+    archive_free_pages_left: int
+    notes_archived: int
+    wal_pages_checkpointed: int
+    checkpoint_complete: bool
+
+
+def current_user(x_notes_user: Optional[str] = Header(None)):
+    """User the request acts for, from the X-Notes-User header
+
+    Requests without one see every note, unless NOTES_REQUIRE_USER=1.
+    Deployments with real authentication replace this dependency with
+    app.dependency_overrides[current_user].
+    """
+    if x_notes_user:
+        return x_notes_user
+    if REQUIRE_USER:
+        raise HTTPException(status_code=401, detail="X-Notes-User header required")
+    return None
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Guard admin routes with NOTES_ADMIN_TOKEN
+
+    Without a configured token the admin routes are refused outright, since
+    they can download the whole database across every user's notes.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin routes are disabled; set NOTES_ADMIN_TOKEN")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def validate_import_record(record):
+    """Check an imported record against NoteCreate and return its columns"""
+    fields = {key: value for key, value in record.items() if key in NoteCreate.model_fields}
+    try:
+        return NoteCreate.model_validate(fields).model_dump()
+    except ValidationError as e:
+        raise ValueError("; ".join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+            for error in e.errors()
+        ))
+
+
+# Startup timings per database, reported at /api/admin/startup
+_startups = {}
+
+
+def create_lifespan(database_url):
+    """Lifespan initialising and warming the database at database_url
+
+    Passed to FastAPI(lifespan=...) by each entry point next to
+    create_router(). It runs init_db, which skips databases already at
+    db.SCHEMA_VERSION. It then warms the connection pool in the
+    background and runs the maintenance loop until shutdown.
+    """
+    startup = _startups.setdefault(database_url, {})
+
+    async def warm_up():
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(db.warm_pool, database_url, WARM_CONNECTIONS)
+        except sqlite3.Error as e:
+            logger.warning("Warming connections to %s failed: %s", database_url, e)
+            return
+        startup["warm_up_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        logger.info("Warmed %d connections to %s in %.1f ms",
+                    WARM_CONNECTIONS, database_url, startup["warm_up_ms"])
+
+    @asynccontextmanager
+    async def lifespan(app):
+        start = time.perf_counter()
+        applied = db.init_db(database_url)
+        ready = time.perf_counter()
+        startup.update(
+            schema_applied=applied,
+            init_db_ms=round((ready - start) * 1000, 1),
+            ready_after_import_ms=round((ready - _imported_at) * 1000, 1),
+            warm_up_ms=None,
+        )
+        logger.info(
+            "Startup of %s: schema %s in %.1f ms, ready %.1f ms after import",
+            database_url, "applied" if applied else "current",
+            startup["init_db_ms"], startup["ready_after_import_ms"],
+        )
+        tasks = [asyncio.create_task(warm_up())]
+        if maintenance.ENABLED:
+            tasks.append(asyncio.create_task(maintenance.maintenance_loop(database_url)))
+        yield
+        for task in tasks:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+    return lifespan
+
+
+def create_router(database_url):
+    """Build the /api/notes routes for the database at database_url
+
+    Handlers that query SQLite are plain functions, so FastAPI runs them
+    in its threadpool and the event loop stays free to admit or shed
+    requests (see notes_core.admission).
+    """
+
+    router = APIRouter(route_class=tracing.TracedRoute)
+    flights = singleflight.Group()
+
+    @router.get("/api/notes", response_model=List[NotePreview])
+    def get_notes(
+        preview: Optional[int] = Query(None, ge=1),
+        include_archived: bool = False,
+        user: Optional[str] = Depends(current_user),
+    ):
+        """Get all notes - Similar to st.dataframe() in Streamlit
+
+        With ``preview`` the description and comment are truncated in
+        SQLite; clients fetch the full body through get_note. Archived
+        notes are only listed with ``include_archived``. With a user only
+        their notes are listed. Identical requests arriving together at
+        the same table version share one query and one serialized response.
+        """
+        with db.get_db(database_url) as conn:
+            version = db.table_version(conn)[0]
+
+        def query():
+            with db.get_db(database_url) as conn:
+                notes = db.list_notes(
+                    conn, preview=preview, include_archived=include_archived, user=user
+                )
+                with tracing.span("fetch rows"):
+                    rows = [dict(row) for row in notes]
+            with tracing.span("serialize", rows=len(rows)):
+                return NOTE_PREVIEWS.dump_json(NOTE_PREVIEWS.validate_python(rows))
+
+        body = flights.do(("get_notes", user, preview, include_archived, version), query)
+        return Response(content=body, media_type="application/json")
+
+    @router.post("/api/notes/import", response_model=ImportResult)
+    def import_notes(
+        file: UploadFile = File(...),
+        format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+        user: Optional[str] = Depends(current_user),
+    ):
+        """Bulk-create notes from a CSV or NDJSON upload
+
+        The upload is parsed line by line and inserted in chunked
+        transactions; invalid lines are reported and skipped. Runs in the
+        threadpool so a large import does not block the event loop.
+        """
+        fmt = format or importer.detect_format(file.filename, file.content_type)
+        if fmt is None:
+            raise HTTPException(
+                status_code=400,
+                detail="Cannot tell the file format; use a .csv or .ndjson file or ?format="
+            )
+        with db.get_db(database_url) as conn:
+            return importer.import_records(
+                conn, importer.iter_records(file.file, fmt), validate_import_record, user=user
+            )
+
+    @router.get("/api/notes/stats", response_model=NoteStats)
+    def get_stats(user: Optional[str] = Depends(current_user)):
+        """Get summary statistics of all notes, archived ones included"""
+        with db.get_db(database_url) as conn:
+            return db.get_stats(conn, user)
+
+    @router.get("/api/notes/by-url", response_model=List[Note])
+    def get_notes_by_url(
+        url: str = Query(..., min_length=1),
+        include_archived: bool = False,
+        user: Optional[str] = Depends(current_user),
+    ):
+        """Find notes linking to url, newest first
+
+        URLs are compared normalized (scheme and host lowercased, tracking
+        parameters and trailing slashes dropped) through an index on the
+        normalized URL's hash, so the lookup does not scan the table.
+        """
+        with db.get_db(database_url) as conn:
+            return db.find_notes_by_url(
+                conn, url, include_archived=include_archived, user=user
+            )
+
+    @router.get("/api/notes/{note_id}", response_model=Note)
+    def get_note(
+        note_id: int,
+        include_archived: bool = False,
+        user: Optional[str] = Depends(current_user),
+    ):
+        """Get a specific note by ID, looking in the archive if asked"""
+        with db.get_db(database_url) as conn:
+            note = db.get_note(conn, note_id, include_archived=include_archived, user=user)
+            if not note:
+                raise HTTPException(status_code=404, detail="Note not found")
+            return note
+
+    @router.post("/api/notes", response_model=Note)
+    def create_note(
+        note: NoteCreate,
+        response: Response,
+        dedupe: bool = False,
+        user: Optional[str] = Depends(current_user),
+    ):
+        """Create a new note - Similar to st.form() submission in Streamlit
+
+        With ``dedupe``, a note that already links to the same normalized
+        URL is returned instead, marked with an X-Notes-Duplicate header.
+        """
+        with db.get_db(database_url) as conn:
+            if not dedupe:
+                return db.create_note(conn, note.model_dump(), user=user)
+            saved, created = db.find_or_create_note(conn, note.model_dump(), user=user)
+            if not created:
+                response.headers["X-Notes-Duplicate"] = "true"
+            return saved
+
+    @router.put("/api/notes/{note_id}", response_model=Note)
+    def update_note(note_id: int, note: NoteUpdate, user: Optional[str] = Depends(current_user)):
+        """Update an existing note"""
+        with db.get_db(database_url) as conn:
+            updated = db.update_note(conn, note_id, note.model_dump(exclude_none=True), user=user)
+            if not updated:
+                raise HTTPException(status_code=404, detail="Note not found")
+            return updated
+
+    @router.delete("/api/notes/{note_id}")
+    def delete_note(note_id: int, user: Optional[str] = Depends(current_user)):
+        """Delete a note"""
+        with db.get_db(database_url) as conn:
+            if not db.delete_note(conn, note_id, user=user):
+                raise HTTPException(status_code=404, detail="Note not found")
+            return {"message": "Note deleted successfully"}
+
+    @router.get("/api/admin/backups/download", dependencies=[Depends(require_admin)])
+    def download_backup():
+        """Stream a consistent snapshot of the database and its archive
+
+        Both are copied with the online backup API into a temporary
+        directory and sent as one zip, named like the live files, which is
+        removed once the response has been sent.
+        """
+        workdir = tempfile.mkdtemp()
+        snapshot = os.path.join(workdir, os.path.basename(database_url))
+        bundle = os.path.join(workdir, "snapshot.zip")
+        try:
+            job = backup.run_backup(database_url, snapshot)
+            with zipfile.ZipFile(bundle, "w", zipfile.ZIP_DEFLATED) as zf:
+                for path in (snapshot, job.archive_target):
+                    if path:
+                        zf.write(path, os.path.basename(path))
+        except (sqlite3.Error, OSError) as e:
+            shutil.rmtree(workdir, ignore_errors=True)
+            raise HTTPException(status_code=500, detail=f"Backup failed: {e}")
+        return FileResponse(
+            bundle,
+            media_type="application/zip",
+            filename=f"notes_{time.strftime('%Y%m%d_%H%M%S')}.zip",
+            background=BackgroundTask(shutil.rmtree, workdir, ignore_errors=True),
+        )
+
+    @router.post("/api/admin/backups", response_model=BackupStatus, status_code=202,
+                 dependencies=[Depends(require_admin)])
+    async def start_backup(name: Optional[str] = None):
+        """Start a backup into the server's backup directory"""
+        try:
+            return backup.start_backup(database_url, name).as_dict()
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @router.get("/api/admin/backups", response_model=List[BackupStatus],
+                dependencies=[Depends(require_admin)])
+    async def list_backups():
+        """List running and recent backups with their progress"""
+        return [job.as_dict() for job in backup.list_jobs()]
+
+    @router.get("/api/admin/backups/{job_id}", response_model=BackupStatus,
+                dependencies=[Depends(require_admin)])
+    async def get_backup(job_id: str):
+        """Get the progress of a backup"""
+        job = backup.get_job(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Backup not found")
+        return job.as_dict()
+
+    @router.get("/api/admin/maintenance", response_model=Optional[MaintenanceReport],
+                dependencies=[Depends(require_admin)])
+    async def get_maintenance():
+        """Report of the last maintenance run, or null if none has run"""
+        return maintenance.last_report(database_url)
+
+    @router.post("/api/admin/maintenance", response_model=MaintenanceReport,
+                 dependencies=[Depends(require_admin)])
+    def run_maintenance(budget: Optional[float] = Query(None, gt=0)):
+        """Run maintenance now, outside the off-peak window"""
+        return maintenance.run_maintenance(database_url, budget)
+
+    @router.get("/api/admin/startup", dependencies=[Depends(require_admin)])
+    async def get_startup():
+        """Timings of this process's startup: schema check and pool warm-up"""
+        return _startups.get(database_url, {})
+
+    @router.get("/api/admin/admission", dependencies=[Depends(require_admin)])
+    async def get_admission():
+        """Queue depth and admitted/shed counts per admission lane"""
+        return admission.metrics()
+
+    @router.get("/api/admin/coalescing", dependencies=[Depends(require_admin)])
+    async def get_coalescing():
+        """Reads executed and shared by single-flight coalescing"""
+        return flights.metrics()
+
+    return router
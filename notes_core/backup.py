@@ -0,0 +1,171 @@
+"""Online backups with SQLite's backup API
+
+A backup copies PAGES_PER_STEP pages at a time and sleeps STEP_SLEEP
+seconds between steps, releasing the source database so live reads and
+writes keep going. If another connection writes to the source mid-copy,
+SQLite restarts the copy from the changed pages, so a backup under heavy
+write load takes longer but always ends with a consistent snapshot.
+
+Archived notes live in a second database (see db.archive_path), which is
+backed up next to the target under the same naming, so a backup pair
+restores like the live pair.
+
+Each backup is tracked as a BackupJob whose progress the API reports.
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from . import db
+
+# Pages copied per backup step
+PAGES_PER_STEP = int(os.environ.get("NOTES_BACKUP_PAGES_PER_STEP", "256"))
+
+# Pause between steps, in seconds, during which the source is unlocked
+STEP_SLEEP = float(os.environ.get("NOTES_BACKUP_STEP_SLEEP", "0.005"))
+
+# Directory that server-side backups are written to
+BACKUP_DIR = os.environ.get("NOTES_BACKUP_DIR", "backups")
+
+# Finished jobs kept for status queries
+MAX_FINISHED_JOBS = 20
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+class BackupJob:
+    """Progress of one backup"""
+
+    def __init__(self, target):
+        self.id = uuid.uuid4().hex
+        self.target = target
+        self.archive_target = None
+        self.status = "running"
+        self.pages_total = None
+        self.pages_remaining = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.error = None
+
+    def progress(self, status, remaining, total):
+        """Backup API progress callback"""
+        self.pages_remaining = remaining
+        self.pages_total = total
+
+    def as_dict(self):
+        done = None
+        if self.pages_total:
+            done = round(100 * (self.pages_total - self.pages_remaining) / self.pages_total, 1)
+        return {
+            "id": self.id,
+            "target": self.target,
+            "archive_target": self.archive_target,
+            "status": self.status,
+            "pages_total": self.pages_total,
+            "pages_remaining": self.pages_remaining,
+            "percent_done": done,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+def _register(job):
+    with _jobs_lock:
+        finished = [j for j in _jobs.values() if j.status != "running"]
+        for old in sorted(finished, key=lambda j: j.started_at)[:-MAX_FINISHED_JOBS]:
+            del _jobs[old.id]
+        _jobs[job.id] = job
+
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def list_jobs():
+    with _jobs_lock:
+        return sorted(_jobs.values(), key=lambda j: j.started_at, reverse=True)
+
+
+def run_backup(source_path, target_path, job=None, pages=None, sleep=None):
+    """Copy the database at source_path and its archive, step by step
+
+    The main database is copied to target_path and the archive, if there
+    is one, to db.archive_path(target_path). Main is copied first: notes
+    are archived by copying before deleting, so a note moved during the
+    backup ends up in both snapshots rather than in neither.
+
+    Blocks the calling thread until the copy is complete; run it in a
+    worker thread from async code.
+    """
+    if job is None:
+        job = BackupJob(target_path)
+        _register(job)
+    source = None
+    try:
+        source = sqlite3.connect(source_path)
+        copies = [("main", target_path)]
+        archive = db.archive_path(source_path)
+        if os.path.exists(archive):
+            source.execute("ATTACH DATABASE ? AS archive", (archive,))
+            job.archive_target = db.archive_path(target_path)
+            copies.append(("archive", job.archive_target))
+        sizes = [source.execute(f"PRAGMA {name}.page_count").fetchone()[0] for name, _ in copies]
+        pause = STEP_SLEEP if sleep is None else sleep
+
+        for i, (name, path) in enumerate(copies):
+            before, after = sum(sizes[:i]), sum(sizes[i + 1:])
+
+            # Progress covers both databases. The backup API only sleeps
+            # when the source is busy, so the pause between steps happens here
+            def progress(status, remaining, total):
+                job.progress(status, remaining + after, before + total + after)
+                if remaining and pause:
+                    time.sleep(pause)
+
+            target = sqlite3.connect(path)
+            try:
+                source.backup(target, pages=pages or PAGES_PER_STEP, progress=progress, name=name)
+            finally:
+                target.close()
+        job.status = "done"
+        job.pages_remaining = 0
+    except (sqlite3.Error, OSError) as e:
+        job.status = "failed"
+        job.error = str(e)
+        raise
+    finally:
+        if source is not None:
+            source.close()
+        job.finished_at = time.time()
+    return job
+
+
+def start_backup(source_path, name=None):
+    """Back up into BACKUP_DIR on a background thread and return the job
+
+    ``name`` is a plain file name; it defaults to a timestamped one.
+    """
+    name = name or f"notes_{time.strftime('%Y%m%d_%H%M%S')}.db"
+    if os.path.basename(name) != name or name in (".", ".."):
+        raise ValueError("Backup name must be a plain file name")
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    target = os.path.join(BACKUP_DIR, name)
+    if os.path.exists(target) or os.path.exists(db.archive_path(target)):
+        raise ValueError(f"Backup {name} already exists")
+
+    job = BackupJob(target)
+    _register(job)
+
+    def run():
+        try:
+            run_backup(source_path, target, job)
+        except (sqlite3.Error, OSError):
+            pass  # recorded on the job
+
+    threading.Thread(target=run, name=f"backup-{job.id}", daemon=True).start()
+    return job
@@ -0,0 +1,350 @@
+"""Benchmark the shared data-access layer
+
+    python -m notes_core.bench               # 10k notes
+    python -m notes_core.bench --rows 100000
+    python -m notes_core.bench --scenario backup
+    python -m notes_core.bench --scenario herd --clients 50
+    python -m notes_core.bench --scenario scoped --rows 200000
+    python -m notes_core.bench --scenario startup --rows 200000
+    python -m notes_core.bench --scenario urls --rows 200000
+
+Times the query functions the apps use, once through the connection pool
+(statements stay prepared on reused connections) and once opening a fresh
+connection per call the way each entry point used to.
+
+The backup scenario measures get_notes latency while online backups run
+back to back, comparing the stepped copy against copying in one step.
+The herd scenario sends a burst of identical get_notes requests through
+the API and counts the list queries reaching SQLite, with and without
+single-flight coalescing. The scoped scenario times list, search and
+stats for one user with SCOPED_USER_NOTES notes among everyone else's,
+which should stay flat as --rows grows.
+
+The startup scenario starts the API under uvicorn in a new process and
+times how long the first GET /api/notes/stats takes to succeed, once with
+the schema already at SCHEMA_VERSION and once forcing init_db to apply it
+again, which is what every start used to do.
+
+The urls scenario times finding the notes for a link through the
+normalized URL hash index against scanning note_url for it.
+"""
+import argparse
+import os
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+
+from . import backup, db, urls
+
+# Notes of the measured user in the scoped scenario
+SCOPED_USER_NOTES = 200
+
+# Server processes started per case in the startup scenario
+STARTUP_RUNS = 5
+
+STARTUP_SERVER = """
+import sys, uvicorn
+from fastapi import FastAPI
+from notes_core.api import create_lifespan, create_router
+app = FastAPI(lifespan=create_lifespan(sys.argv[1]))
+app.include_router(create_router(sys.argv[1]))
+uvicorn.run(app, host="127.0.0.1", port=int(sys.argv[2]), log_level="warning")
+"""
+
+
+def seed(path, rows, creator=lambda i: "user"):
+    """Create a notes database with the given number of rows
+
+    ``creator`` maps a row number to its created_by.
+    """
+    db.init_db(path)
+    with sqlite3.connect(path) as conn:
+        conn.executemany("""
+            INSERT INTO my_note (note_name, note_description, note_url, note_comment,
+                                 note_url_normalized, note_url_hash, created_by, updated_by)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            (f"note {i}", "lorem ipsum " * (i % 40), f"https://example.com/{i}", "comment",
+             *urls.url_key(f"https://example.com/{i}"), creator(i), creator(i))
+            for i in range(rows)
+        ))
+
+
+@contextmanager
+def fresh_connection(path):
+    """Open and close a connection per call, like the old get_db()"""
+    conn = db.connect(path)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def ops_per_second(func, seconds=1.0):
+    """Call func repeatedly for about the given time and return calls/s"""
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        func()
+        calls += 1
+    return calls / (time.perf_counter() - start)
+
+
+def operations(path, rows, connection):
+    """Named callables exercising each query through the given connection factory"""
+    counter = iter(range(10**9))
+
+    def get_note():
+        with connection(path) as conn:
+            db.get_note(conn, next(counter) % rows + 1)
+
+    def list_preview():
+        with connection(path) as conn:
+            db.list_notes(conn, preview=100, limit=50).fetchall()
+
+    def stats():
+        with connection(path) as conn:
+            db.get_stats(conn)
+
+    def update_note():
+        with connection(path) as conn:
+            db.update_note(conn, next(counter) % rows + 1, {"note_comment": "edited"})
+
+    return {
+        "get_note": get_note,
+        "list_notes (50, preview)": list_preview,
+        "get_stats": stats,
+        "update_note": update_note,
+    }
+
+
+def query_rates(path, rows, seconds):
+    """Print ops/s of each query with fresh and pooled connections"""
+    pooled = operations(path, rows, db.get_db)
+    fresh = operations(path, rows, fresh_connection)
+    print(f"  {'operation':28}{'fresh conn/s':>14}{'pooled/s':>14}")
+    for name in pooled:
+        fresh_rate = ops_per_second(fresh[name], seconds)
+        pooled_rate = ops_per_second(pooled[name], seconds)
+        print(f"  {name:28}{fresh_rate:14,.0f}{pooled_rate:14,.0f}")
+
+
+def latencies(func, seconds=1.0):
+    """Call func repeatedly for about the given time; return (p50, p99) in ms"""
+    samples = []
+    start = time.perf_counter()
+    while len(samples) < 2 or time.perf_counter() - start < seconds:
+        call_start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - call_start) * 1000)
+    cuts = statistics.quantiles(samples, n=100)
+    return cuts[49], cuts[98]
+
+
+def backup_latency(path, tmp, seconds):
+    """Print get_notes latency with no backup and during repeated backups"""
+    def get_notes():
+        with db.get_db(path) as conn:
+            db.list_notes(conn, preview=100).fetchall()
+
+    def during_backups(pages, sleep):
+        stop = threading.Event()
+        copies = []
+
+        def run():
+            while not stop.is_set():
+                target = os.path.join(tmp, f"backup_{len(copies)}.db")
+                backup.run_backup(path, target, pages=pages, sleep=sleep)
+                copies.append(target)
+                os.remove(target)
+
+        worker = threading.Thread(target=run)
+        worker.start()
+        try:
+            return latencies(get_notes, seconds) + (len(copies),)
+        finally:
+            stop.set()
+            worker.join()
+
+    print(f"  {'get_notes (preview)':34}{'p50 ms':>10}{'p99 ms':>10}{'backups':>10}")
+    p50, p99 = latencies(get_notes, seconds)
+    print(f"  {'no backup':34}{p50:10.2f}{p99:10.2f}{'-':>10}")
+    scenarios = {
+        f"stepped ({backup.PAGES_PER_STEP} pages, {backup.STEP_SLEEP * 1000:g} ms)":
+            (backup.PAGES_PER_STEP, backup.STEP_SLEEP),
+        "one step": (-1, 0),
+    }
+    for label, (pages, sleep) in scenarios.items():
+        p50, p99, copies = during_backups(pages, sleep)
+        print(f"  {label:34}{p50:10.2f}{p99:10.2f}{copies:10}")
+
+
+def herd(path, clients):
+    """Print SQLite queries and wall time for a burst of identical get_notes"""
+    import asyncio
+    import httpx
+    from fastapi import FastAPI
+    from . import api, singleflight
+
+    app = FastAPI(lifespan=api.create_lifespan(path))
+    app.include_router(api.create_router(path))
+    statements = []
+    connect = db.connect
+
+    def traced_connect(conn_path):
+        conn = connect(conn_path)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    async def burst():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            responses = await asyncio.gather(*(
+                client.get("/api/notes", params={"preview": 100}) for _ in range(clients)
+            ))
+        assert all(response.status_code == 200 for response in responses)
+
+    enabled = singleflight.ENABLED
+    db.connect = traced_connect
+    try:
+        print(f"  {clients} concurrent GET /api/notes?preview=100")
+        print(f"  {'':16}{'list queries':>14}{'version reads':>15}{'wall s':>10}")
+        for label, coalesce in (("no coalescing", False), ("single-flight", True)):
+            singleflight.ENABLED = coalesce
+            db.close_pool(path)
+            statements.clear()
+            start = time.perf_counter()
+            asyncio.run(burst())
+            elapsed = time.perf_counter() - start
+            lists = sum("FROM my_note" in sql and "ORDER BY" in sql for sql in statements)
+            versions = sum("FROM note_changes" in sql for sql in statements)
+            print(f"  {label:16}{lists:14}{versions:15}{elapsed:10.2f}")
+    finally:
+        db.connect = connect
+        singleflight.ENABLED = enabled
+
+
+def scoped(path, seconds):
+    """Print latency of one user's list, search and stats, scoped and unscoped"""
+    def timed(**kwargs):
+        def run():
+            with db.get_db(path) as conn:
+                db.list_notes(conn, **kwargs).fetchall()
+        return run
+
+    def stats(user):
+        def run():
+            with db.get_db(path) as conn:
+                db.get_stats(conn, user)
+        return run
+
+    operations = {
+        "list (preview)": (timed(preview=100, user="alice"), timed(preview=100)),
+        "search": (timed(search="note 1", user="alice"), timed(search="note 1")),
+        "first page (50)": (timed(limit=50, user="alice"), timed(limit=50)),
+        "stats": (stats("alice"), stats(None)),
+    }
+    print(f"  alice has {SCOPED_USER_NOTES} notes")
+    print(f"  {'operation':20}{'alice p50 ms':>14}{'all users p50 ms':>18}")
+    for name, (user_op, all_op) in operations.items():
+        print(f"  {name:20}{latencies(user_op, seconds)[0]:14.3f}{latencies(all_op, seconds)[0]:18.3f}")
+
+
+def time_to_first_response(path):
+    """Seconds from spawning an API server on path to its first 200"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-c", STARTUP_SERVER, path, str(port)], cwd=root)
+    try:
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/notes/stats") as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                if server.poll() is not None:
+                    raise RuntimeError("API server exited during startup")
+                time.sleep(0.005)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def startup(path):
+    """Print time to first response with the schema current and reapplied"""
+    db.close_pool(path)
+    print(f"  {'schema at startup':20}{'median ms':>12}{'min ms':>10}")
+    for label, reset in (("applied", True), ("current (skipped)", False)):
+        runs = []
+        for _ in range(STARTUP_RUNS):
+            if reset:
+                with sqlite3.connect(path) as conn:
+                    conn.execute("PRAGMA user_version = 0")
+            runs.append(time_to_first_response(path) * 1000)
+        print(f"  {label:20}{statistics.median(runs):12.0f}{min(runs):10.0f}")
+
+
+def url_lookup(path, rows, seconds):
+    """Print latency of finding a note by URL, indexed and by scanning"""
+    url = f"https://example.com/{rows // 2}"
+
+    def indexed():
+        with db.get_db(path) as conn:
+            db.find_notes_by_url(conn, f"HTTPS://EXAMPLE.COM/{rows // 2}/?utm_source=bench")
+
+    def scanned():
+        with db.get_db(path) as conn:
+            conn.execute("SELECT id FROM my_note WHERE note_url = ?", (url,)).fetchall()
+
+    print(f"  {'lookup':28}{'p50 ms':>10}{'p99 ms':>10}")
+    for label, func in (("normalized URL hash index", indexed), ("note_url scan", scanned)):
+        p50, p99 = latencies(func, seconds)
+        print(f"  {label:28}{p50:10.3f}{p99:10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--seconds", type=float, default=1.0, help="time per operation")
+    parser.add_argument("--scenario", default="queries",
+                        choices=["queries", "backup", "herd", "scoped", "startup", "urls"])
+    parser.add_argument("--clients", type=int, default=50, help="burst size for --scenario herd")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench_notes.db")
+        if args.scenario == "scoped":
+            # Spread alice's notes through the table among 100 other users
+            step = max(args.rows // SCOPED_USER_NOTES, 1)
+            seed(path, args.rows, lambda i: "alice" if i % step == 0 else f"user{i % 100}")
+        else:
+            seed(path, args.rows)
+
+        print(f"{args.rows:,} notes")
+        if args.scenario == "backup":
+            backup_latency(path, tmp, args.seconds)
+        elif args.scenario == "herd":
+            herd(path, args.clients)
+        elif args.scenario == "scoped":
+            scoped(path, args.seconds)
+        elif args.scenario == "startup":
+            startup(path)
+        elif args.scenario == "urls":
+            url_lookup(path, args.rows, args.seconds)
+        else:
+            query_rates(path, args.rows, args.seconds)
+        db.close_pool(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Transparent compression of large note bodies
+
+note_description and note_comment values longer than a threshold are
+stored as a BLOB: one marker byte naming the codec followed by the
+compressed UTF-8 text. Plain TEXT values are left as they are, so a
+database may mix both and every reader decodes them through
+``decompress`` (registered in SQLite as ``note_text``).
+
+Compression on write is off unless NOTES_COMPRESS_THRESHOLD is set to a
+size in bytes. NOTES_COMPRESS_CODEC picks ``zlib`` (default) or ``zstd``,
+which needs the optional ``zstandard`` package.
+
+Existing rows are converted with
+
+    python -m notes_core.compression notes.db --threshold 4096 --vacuum
+    python -m notes_core.compression notes.db --decompress
+
+which reports the database size and read throughput before and after.
+"""
+import argparse
+import os
+import time
+import zlib
+
+ZLIB = b"\x01"
+ZSTD = b"\x02"
+
+# Columns that may hold compressed bodies
+COMPRESSED_COLUMNS = ("note_description", "note_comment")
+
+# Bodies longer than this many UTF-8 bytes are compressed on write; 0 disables
+THRESHOLD = int(os.environ.get("NOTES_COMPRESS_THRESHOLD", "0"))
+CODEC = os.environ.get("NOTES_COMPRESS_CODEC", "zlib")
+
+
+def _zstd():
+    """The zstandard module, imported on first use to keep startup light"""
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd compression needs the zstandard package") from None
+    return zstandard
+
+
+def compress(text, threshold=None, codec=None):
+    """Return text, or its marker-prefixed compressed form if it is large
+
+    Values that do not shrink are kept as text.
+    """
+    threshold = THRESHOLD if threshold is None else threshold
+    if not threshold or not isinstance(text, str):
+        return text
+    data = text.encode()
+    if len(data) <= threshold:
+        return text
+    if (codec or CODEC) == "zstd":
+        packed = ZSTD + _zstd().ZstdCompressor().compress(data)
+    else:
+        packed = ZLIB + zlib.compress(data)
+    return packed if len(packed) < len(data) else text
+
+
+def decompress(value):
+    """Return the text of a stored body, compressed or not"""
+    if not isinstance(value, bytes):
+        return value
+    marker, payload = value[:1], value[1:]
+    if marker == ZLIB:
+        return zlib.decompress(payload).decode()
+    if marker == ZSTD:
+        return _zstd().ZstdDecompressor().decompress(payload).decode()
+    raise ValueError(f"Unknown body compression marker {marker!r}")
+
+
+def sql_text(column):
+    """SQL expression reading a body column as text
+
+    Only BLOB values go through the Python decoder; TEXT is read as is.
+    """
+    return f"CASE WHEN typeof({column}) = 'blob' THEN note_text({column}) ELSE {column} END"
+
+
+def database_size(path):
+    """Size in bytes of the database file and its WAL"""
+    wal = f"{path}-wal"
+    return os.path.getsize(path) + (os.path.getsize(wal) if os.path.exists(wal) else 0)
+
+
+def read_throughput(path):
+    """Read every note through list_notes; return (rows/s, text MB/s)"""
+    from . import db
+
+    with db.get_db(path) as conn:
+        start = time.perf_counter()
+        rows = db.list_notes(conn).fetchall()
+        elapsed = time.perf_counter() - start
+    text_bytes = sum(
+        len((row[column] or "").encode()) for row in rows for column in COMPRESSED_COLUMNS
+    )
+    return len(rows) / elapsed, text_bytes / elapsed / 1e6
+
+
+def migrate(path, threshold, codec="zlib", decompress_all=False, batch_size=500):
+    """Rewrite stored bodies to match the threshold; return rows changed
+
+    Covers hot and archived notes. Runs in batches of committed
+    transactions ordered by id, so a live app is only blocked for one
+    batch at a time. updated_at is left untouched.
+    """
+    from . import db
+
+    changed = 0
+    with db.get_db(path) as conn:
+        for table in ("main.my_note", "archive.my_note"):
+            last_id = 0
+            while True:
+                rows = conn.execute(f"""
+                    SELECT id, note_description, note_comment FROM {table}
+                    WHERE id > ? ORDER BY id LIMIT ?
+                """, (last_id, batch_size)).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1]["id"]
+                updates = []
+                for row in rows:
+                    values = []
+                    for column in COMPRESSED_COLUMNS:
+                        text = decompress(row[column])
+                        values.append(text if decompress_all else compress(text, threshold, codec))
+                    if values != [row[column] for column in COMPRESSED_COLUMNS]:
+                        updates.append(values + [row["id"]])
+                conn.executemany(f"""
+                    UPDATE {table} SET note_description = ?, note_comment = ? WHERE id = ?
+                """, updates)
+                conn.commit()
+                changed += len(updates)
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress or decompress stored note bodies")
+    parser.add_argument("database")
+    parser.add_argument("--threshold", type=int, default=THRESHOLD or 4096,
+                        help="compress bodies larger than this many bytes")
+    parser.add_argument("--codec", choices=["zlib", "zstd"], default=CODEC)
+    parser.add_argument("--decompress", action="store_true", help="store every body as text")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to release space")
+    args = parser.parse_args()
+
+    from . import db
+
+    def report(label):
+        with db.get_db(args.database) as conn:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        rows_per_s, mb_per_s = read_throughput(args.database)
+        size = database_size(args.database)
+        print(f"{label:8} size {size / 1e6:10.2f} MB   read {rows_per_s:12,.0f} rows/s {mb_per_s:10.1f} MB/s")
+
+    report("before")
+    changed = migrate(args.database, args.threshold, args.codec, args.decompress)
+    if args.vacuum:
+        with db.get_db(args.database) as conn:
+            conn.execute("VACUUM")
+            conn.execute("VACUUM archive")
+    report("after")
+    print(f"{changed:,} notes rewritten")
+    db.close_pool(args.database)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,750 @@
+"""Connection setup, schema and queries for the my_note table
+
+Every entry point (the FastAPI backends and the Streamlit app) goes through
+these functions, so the schema and the SQL live in one place.
+
+Connections are pooled per database path and reused, which lets sqlite3's
+per-connection statement cache keep the prepared statements below across
+requests instead of re-preparing them on every call.
+
+Notes that have not been updated for a while can be moved to an archive
+database next to the main one (notes.db -> notes_archive.db), attached to
+every connection as ``archive``. Reads stay on the hot table unless asked
+to include the archive.
+"""
+import json
+import os
+import sqlite3
+import threading
+from contextlib import ExitStack, contextmanager
+
+from . import compression, tracing, urls
+
+# Idle connections kept per database path
+POOL_SIZE = 8
+
+# Prepared statements kept per connection
+CACHED_STATEMENTS = 256
+
+# Change log entries kept for incremental cache refreshes
+CHANGE_LOG_RETENTION = 10000
+
+NOTE_COLUMNS = (
+    "id", "note_name", "note_description", "note_url", "note_comment",
+    "created_at", "updated_at", "created_by", "updated_by",
+)
+
+# Columns a client may set on create or update
+EDITABLE_COLUMNS = ("note_name", "note_description", "note_url", "note_comment")
+
+# Derived from note_url on every write (see notes_core.urls); init_db adds
+# them to tables created before they existed
+URL_KEY_COLUMNS = {"note_url_normalized": "TEXT", "note_url_hash": "INTEGER"}
+
+# Notes moved to the archive per transaction
+ARCHIVE_BATCH_SIZE = 500
+
+# Stored in PRAGMA user_version; bump it whenever SCHEMA or ARCHIVE_SCHEMA
+# changes so init_db applies the new definitions
+SCHEMA_VERSION = 3
+
+# Statistics of one schema's my_note, kept current by triggers so reading
+# them is O(1); created in main and in archive, and get_stats adds the two
+STATS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS {schema}.note_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total_notes INTEGER NOT NULL DEFAULT 0,
+        with_url INTEGER NOT NULL DEFAULT 0,
+        with_description INTEGER NOT NULL DEFAULT 0,
+        last_updated TIMESTAMP
+    );
+    INSERT OR IGNORE INTO {schema}.note_stats
+        (id, total_notes, with_url, with_description, last_updated)
+    SELECT 1, count(*),
+           coalesce(sum(coalesce(note_url, '') <> ''), 0),
+           coalesce(sum(coalesce(note_description, '') <> ''), 0),
+           max(updated_at)
+    FROM {schema}.my_note;
+    CREATE TRIGGER IF NOT EXISTS {schema}.note_stats_insert AFTER INSERT ON my_note
+    BEGIN
+        UPDATE note_stats SET
+            total_notes = total_notes + 1,
+            with_url = with_url + (coalesce(NEW.note_url, '') <> ''),
+            with_description = with_description + (coalesce(NEW.note_description, '') <> ''),
+            last_updated = (SELECT max(updated_at) FROM my_note)
+        WHERE id = 1;
+    END;
+    -- Update triggers only watch the columns they use, so writing the
+    -- derived URL key does not fire them; recreated on every schema upgrade
+    DROP TRIGGER IF EXISTS {schema}.note_stats_update;
+    CREATE TRIGGER {schema}.note_stats_update
+    AFTER UPDATE OF note_description, note_url, updated_at ON my_note
+    BEGIN
+        UPDATE note_stats SET
+            with_url = with_url - (coalesce(OLD.note_url, '') <> '')
+                                + (coalesce(NEW.note_url, '') <> ''),
+            with_description = with_description - (coalesce(OLD.note_description, '') <> '')
+                                                + (coalesce(NEW.note_description, '') <> ''),
+            last_updated = (SELECT max(updated_at) FROM my_note)
+        WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS {schema}.note_stats_delete AFTER DELETE ON my_note
+    BEGIN
+        UPDATE note_stats SET
+            total_notes = total_notes - 1,
+            with_url = with_url - (coalesce(OLD.note_url, '') <> ''),
+            with_description = with_description - (coalesce(OLD.note_description, '') <> ''),
+            last_updated = (SELECT max(updated_at) FROM my_note)
+        WHERE id = 1;
+    END;
+
+    -- The same statistics per created_by, for requests scoped to one user
+    CREATE TABLE IF NOT EXISTS {schema}.note_user_stats (
+        created_by TEXT PRIMARY KEY NOT NULL,
+        total_notes INTEGER NOT NULL DEFAULT 0,
+        with_url INTEGER NOT NULL DEFAULT 0,
+        with_description INTEGER NOT NULL DEFAULT 0,
+        last_updated TIMESTAMP
+    );
+    INSERT OR IGNORE INTO {schema}.note_user_stats
+        (created_by, total_notes, with_url, with_description, last_updated)
+    SELECT created_by, count(*),
+           sum(coalesce(note_url, '') <> ''),
+           sum(coalesce(note_description, '') <> ''),
+           max(updated_at)
+    FROM {schema}.my_note WHERE created_by IS NOT NULL GROUP BY created_by;
+    CREATE TRIGGER IF NOT EXISTS {schema}.note_user_stats_insert AFTER INSERT ON my_note
+    WHEN NEW.created_by IS NOT NULL
+    BEGIN
+        INSERT OR IGNORE INTO note_user_stats (created_by) VALUES (NEW.created_by);
+        UPDATE note_user_stats SET
+            total_notes = total_notes + 1,
+            with_url = with_url + (coalesce(NEW.note_url, '') <> ''),
+            with_description = with_description + (coalesce(NEW.note_description, '') <> ''),
+            last_updated = (SELECT max(updated_at) FROM my_note WHERE created_by = NEW.created_by)
+        WHERE created_by = NEW.created_by;
+    END;
+    DROP TRIGGER IF EXISTS {schema}.note_user_stats_update;
+    CREATE TRIGGER {schema}.note_user_stats_update
+    AFTER UPDATE OF note_description, note_url, updated_at, created_by ON my_note
+    BEGIN
+        UPDATE note_user_stats SET
+            total_notes = total_notes - 1,
+            with_url = with_url - (coalesce(OLD.note_url, '') <> ''),
+            with_description = with_description - (coalesce(OLD.note_description, '') <> ''),
+            last_updated = (SELECT max(updated_at) FROM my_note WHERE created_by = OLD.created_by)
+        WHERE created_by = OLD.created_by;
+        INSERT OR IGNORE INTO note_user_stats (created_by)
+        SELECT NEW.created_by WHERE NEW.created_by IS NOT NULL;
+        UPDATE note_user_stats SET
+            total_notes = total_notes + 1,
+            with_url = with_url + (coalesce(NEW.note_url, '') <> ''),
+            with_description = with_description + (coalesce(NEW.note_description, '') <> ''),
+            last_updated = (SELECT max(updated_at) FROM my_note WHERE created_by = NEW.created_by)
+        WHERE created_by = NEW.created_by;
+    END;
+    CREATE TRIGGER IF NOT EXISTS {schema}.note_user_stats_delete AFTER DELETE ON my_note
+    BEGIN
+        UPDATE note_user_stats SET
+            total_notes = total_notes - 1,
+            with_url = with_url - (coalesce(OLD.note_url, '') <> ''),
+            with_description = with_description - (coalesce(OLD.note_description, '') <> ''),
+            last_updated = (SELECT max(updated_at) FROM my_note WHERE created_by = OLD.created_by)
+        WHERE created_by = OLD.created_by;
+    END;
+"""
+
+SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS my_note (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        note_name TEXT NOT NULL,
+        note_description TEXT,
+        note_url TEXT,
+        note_comment TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        created_by TEXT DEFAULT 'user',
+        updated_by TEXT DEFAULT 'user',
+        note_url_normalized TEXT,
+        note_url_hash INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS idx_my_note_updated_at ON my_note (updated_at);
+    CREATE INDEX IF NOT EXISTS idx_my_note_created_by_updated_at
+        ON my_note (created_by, updated_at);
+    CREATE INDEX IF NOT EXISTS idx_my_note_url_hash
+        ON my_note (note_url_hash) WHERE note_url_hash IS NOT NULL;
+
+    {STATS_SCHEMA.format(schema="main")}
+    -- Change log: each write bumps the table version and records the note id
+    CREATE TABLE IF NOT EXISTS note_changes (
+        version INTEGER PRIMARY KEY AUTOINCREMENT,
+        note_id INTEGER NOT NULL
+    );
+    CREATE TRIGGER IF NOT EXISTS note_changes_insert AFTER INSERT ON my_note
+    BEGIN
+        INSERT INTO note_changes (note_id) VALUES (NEW.id);
+        DELETE FROM note_changes
+        WHERE version <= (SELECT max(version) FROM note_changes) - {CHANGE_LOG_RETENTION};
+    END;
+    DROP TRIGGER IF EXISTS note_changes_update;
+    CREATE TRIGGER note_changes_update AFTER UPDATE OF {", ".join(NOTE_COLUMNS)} ON my_note
+    BEGIN
+        INSERT INTO note_changes (note_id) SELECT OLD.id UNION SELECT NEW.id;
+        DELETE FROM note_changes
+        WHERE version <= (SELECT max(version) FROM note_changes) - {CHANGE_LOG_RETENTION};
+    END;
+    CREATE TRIGGER IF NOT EXISTS note_changes_delete AFTER DELETE ON my_note
+    BEGIN
+        INSERT INTO note_changes (note_id) VALUES (OLD.id);
+        DELETE FROM note_changes
+        WHERE version <= (SELECT max(version) FROM note_changes) - {CHANGE_LOG_RETENTION};
+    END;
+"""
+
+# Cold notes, same columns as my_note; ids are kept so they can move back
+ARCHIVE_SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS archive.my_note (
+        id INTEGER PRIMARY KEY,
+        note_name TEXT NOT NULL,
+        note_description TEXT,
+        note_url TEXT,
+        note_comment TEXT,
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP,
+        created_by TEXT,
+        updated_by TEXT,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        note_url_normalized TEXT,
+        note_url_hash INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS archive.idx_my_note_updated_at ON my_note (updated_at);
+    CREATE INDEX IF NOT EXISTS archive.idx_my_note_created_by_updated_at
+        ON my_note (created_by, updated_at);
+    CREATE INDEX IF NOT EXISTS archive.idx_my_note_url_hash
+        ON my_note (note_url_hash) WHERE note_url_hash IS NOT NULL;
+    {STATS_SCHEMA.format(schema="archive")}
+"""
+
+STORED_COLUMNS = ", ".join(NOTE_COLUMNS + tuple(URL_KEY_COLUMNS))
+
+# Hot and archived notes together; a note found in both (a move cut short)
+# is read from the hot table
+ALL_NOTES = f"""(
+    SELECT {STORED_COLUMNS} FROM main.my_note
+    UNION ALL
+    SELECT {STORED_COLUMNS} FROM archive.my_note
+    WHERE id NOT IN (SELECT id FROM main.my_note)
+)"""
+
+# Bodies may be stored compressed; these read them back as text
+DESCRIPTION = compression.sql_text("note_description")
+COMMENT = compression.sql_text("note_comment")
+
+SELECT_COLUMNS = f"""id, note_name,
+           {DESCRIPTION} AS note_description,
+           note_url,
+           {COMMENT} AS note_comment,
+           created_at, updated_at, created_by, updated_by"""
+
+# Point statements take :user; NULL leaves them unscoped
+OWNED_BY = "(:user IS NULL OR created_by = :user)"
+
+SELECT_NOTE = f"""
+    SELECT {SELECT_COLUMNS}
+    FROM my_note WHERE id = :id AND {OWNED_BY}
+"""
+
+SELECT_ARCHIVED_NOTE = f"""
+    SELECT {SELECT_COLUMNS}
+    FROM archive.my_note WHERE id = :id AND {OWNED_BY}
+"""
+
+# Probe the hash index, then compare the key itself in case of a collision
+NOTES_BY_URL = f"""
+    WHERE note_url_hash = :hash AND note_url_normalized = :url AND {OWNED_BY}
+    ORDER BY updated_at DESC, id DESC
+"""
+SELECT_NOTES_BY_URL = f"SELECT {SELECT_COLUMNS} FROM my_note {NOTES_BY_URL}"
+SELECT_ARCHIVED_NOTES_BY_URL = f"SELECT {SELECT_COLUMNS} FROM archive.my_note {NOTES_BY_URL}"
+
+INSERT_NOTE = """
+    INSERT INTO my_note (note_name, note_description, note_url, note_comment,
+                         note_url_normalized, note_url_hash)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+INSERT_USER_NOTE = """
+    INSERT INTO my_note (note_name, note_description, note_url, note_comment,
+                         note_url_normalized, note_url_hash, created_by, updated_by)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def archive_path(path):
+    """Path of the archive database kept next to the database at path"""
+    root, ext = os.path.splitext(path)
+    return f"{root}_archive{ext or '.db'}"
+
+
+def connect(path):
+    """Open a connection with the settings every entry point shares"""
+    conn = sqlite3.connect(
+        path, cached_statements=CACHED_STATEMENTS, check_same_thread=False,
+        factory=tracing.TracedConnection if tracing.ENABLED else sqlite3.Connection,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.create_function("note_text", 1, compression.decompress, deterministic=True)
+    conn.execute("PRAGMA busy_timeout = 5000")
+    conn.execute("ATTACH DATABASE ? AS archive", (archive_path(path),))
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA archive.synchronous = NORMAL")
+    return conn
+
+
+@contextmanager
+def get_db(path):
+    """Borrow a pooled connection to the database at path
+
+    The connection is handed to one caller at a time; any transaction
+    left open is rolled back before it goes back to the pool.
+    """
+    with tracing.span("acquire connection", path=path) as span:
+        with _pools_lock:
+            pool = _pools.setdefault(path, [])
+            conn = pool.pop() if pool else None
+        if span:
+            span.args["pooled"] = conn is not None
+        if conn is None:
+            conn = connect(path)
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        with _pools_lock:
+            if len(pool) < POOL_SIZE:
+                pool.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+
+
+def close_pool(path):
+    """Close the idle pooled connections to the database at path"""
+    with _pools_lock:
+        pool = _pools.pop(path, [])
+    for conn in pool:
+        conn.close()
+
+
+def init_db(path):
+    """Create the notes schema, statistics, change log and archive if missing
+
+    Databases already at SCHEMA_VERSION are left alone, so starting up
+    does not pay for the DDL and the statistics seeding, which scan the
+    whole table. Returns whether the schema was applied.
+
+    auto_vacuum only takes effect on a database without tables yet, so
+    existing databases keep their mode (see notes_core.maintenance).
+    """
+    with sqlite3.connect(path) as conn:
+        conn.execute("ATTACH DATABASE ? AS archive", (archive_path(path),))
+        schemas = ("main", "archive")
+        if all(conn.execute(f"PRAGMA {schema}.user_version").fetchone()[0] == SCHEMA_VERSION
+               for schema in schemas):
+            return False
+        for schema in schemas:
+            conn.execute(f"PRAGMA {schema}.auto_vacuum = INCREMENTAL")
+            conn.execute(f"PRAGMA {schema}.journal_mode = WAL")
+            _add_url_key_columns(conn, schema)
+        conn.executescript(f"BEGIN; {SCHEMA} {ARCHIVE_SCHEMA} COMMIT;")
+        for schema in schemas:
+            _fill_url_keys(conn, schema)
+            conn.execute(f"PRAGMA {schema}.user_version = {SCHEMA_VERSION}")
+    return True
+
+
+def _add_url_key_columns(conn, schema):
+    """Add the URL key columns to a my_note table created without them"""
+    existing = {row[1] for row in conn.execute(f"PRAGMA {schema}.table_info(my_note)")}
+    for column, kind in URL_KEY_COLUMNS.items():
+        if existing and column not in existing:
+            conn.execute(f"ALTER TABLE {schema}.my_note ADD COLUMN {column} {kind}")
+
+
+def _fill_url_keys(conn, schema):
+    """Compute the URL key of notes written before it was maintained"""
+    rows = conn.execute(f"""
+        SELECT id, note_url FROM {schema}.my_note
+        WHERE coalesce(note_url, '') <> '' AND note_url_hash IS NULL
+    """).fetchall()
+    conn.executemany(
+        f"UPDATE {schema}.my_note SET note_url_normalized = ?, note_url_hash = ? WHERE id = ?",
+        [(*urls.url_key(url), note_id) for note_id, url in rows],
+    )
+
+
+def warm_pool(path, connections=2):
+    """Open pooled connections ahead of the first requests
+
+    Each one runs the common reads once, so their statements are
+    prepared and the pages they touch are in the OS cache.
+    """
+    with ExitStack() as stack:
+        for _ in range(connections):
+            conn = stack.enter_context(get_db(path))
+            get_stats(conn)
+            get_note(conn, 0)
+            list_notes(conn, preview=100, limit=50).fetchall()
+
+
+def _note_filter(search=None, only_with_url=False):
+    """SQL conditions and named parameters for the search and URL filters"""
+    clauses = []
+    params = {}
+    if search:
+        escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        clauses.append(f"""(note_name LIKE :search ESCAPE '\\'
+             OR {DESCRIPTION} LIKE :search ESCAPE '\\'
+             OR {COMMENT} LIKE :search ESCAPE '\\')""")
+        params["search"] = f"%{escaped}%"
+    if only_with_url:
+        clauses.append("coalesce(note_url, '') <> ''")
+    return clauses, params
+
+
+def list_notes(conn, preview=None, search=None, only_with_url=False,
+               after=None, limit=None, changed_since=None, include_archived=False,
+               user=None):
+    """Query notes newest first and return the cursor
+
+    ``preview`` truncates description and comment to that many characters
+    in SQLite and adds ``description_truncated`` and ``comment_truncated``
+    columns. ``after`` is the
+    (updated_at, id) key of the last row of the previous page for keyset
+    pagination. ``changed_since`` restricts the result to notes written
+    after that table version. ``include_archived`` adds archived notes.
+    ``user`` keeps only the notes created by that user, read through the
+    (created_by, updated_at) index unless ``changed_since`` is given.
+    """
+    clauses, params = _note_filter(search, only_with_url)
+    if user is not None:
+        # With changed_since the change log should drive the query (a few
+        # rowid lookups and a small sort); unary + keeps SQLite from walking
+        # the user's whole (created_by, updated_at) index to skip the sort
+        clauses.insert(0, "+created_by = :user" if changed_since is not None
+                       else "created_by = :user")
+        params["user"] = user
+    if after is not None:
+        clauses.append("(updated_at, id) < (:after_updated_at, :after_id)")
+        params["after_updated_at"], params["after_id"] = after
+    if changed_since is not None:
+        clauses.append("id IN (SELECT note_id FROM note_changes WHERE version > :since)")
+        params["since"] = changed_since
+
+    if preview:
+        # Truncate long text in SQLite so list payloads stay small
+        columns = f"""id, note_name,
+               substr({DESCRIPTION}, 1, :preview) AS note_description,
+               note_url,
+               substr({COMMENT}, 1, :preview) AS note_comment,
+               created_at, updated_at, created_by, updated_by,
+               coalesce(length({DESCRIPTION}), 0) > :preview AS description_truncated,
+               coalesce(length({COMMENT}), 0) > :preview AS comment_truncated"""
+        params["preview"] = preview
+    else:
+        columns = SELECT_COLUMNS
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    query = f"""
+        SELECT {columns}
+        FROM {ALL_NOTES if include_archived else "my_note"}
+        {where}
+        ORDER BY updated_at DESC, id DESC
+    """
+    if limit is not None:
+        query += " LIMIT :limit"
+        params["limit"] = limit
+    return conn.execute(query, params)
+
+
+def _stored(column, value):
+    """Value as written to the table, compressing large bodies"""
+    if column in compression.COMPRESSED_COLUMNS:
+        return compression.compress(value)
+    return value
+
+
+def get_note(conn, note_id, include_archived=False, user=None):
+    """Get a note by id as a dict, or None
+
+    Archived notes are only looked up with ``include_archived``. With
+    ``user``, notes created by someone else are not found.
+    """
+    params = {"id": note_id, "user": user}
+    row = conn.execute(SELECT_NOTE, params).fetchone()
+    if row is None and include_archived:
+        row = conn.execute(SELECT_ARCHIVED_NOTE, params).fetchone()
+    return dict(row) if row else None
+
+
+def _archived(conn, note_id, user=None):
+    """Whether note_id is in the archive (and, with ``user``, theirs)"""
+    return conn.execute(
+        f"SELECT 1 FROM archive.my_note WHERE id = :id AND {OWNED_BY}",
+        {"id": note_id, "user": user},
+    ).fetchone() is not None
+
+
+def note_exists(conn, note_id):
+    return conn.execute("SELECT 1 FROM my_note WHERE id = ?", (note_id,)).fetchone() is not None
+
+
+def find_notes_by_url(conn, url, include_archived=False, user=None):
+    """Notes whose URL normalizes to the same key as url, newest first
+
+    Read through the index on note_url_hash. Archived notes follow the
+    hot ones with ``include_archived``; ``user`` keeps only their notes.
+    """
+    normalized, key = urls.url_key(url)
+    if normalized is None:
+        return []
+    params = {"url": normalized, "hash": key, "user": user}
+    notes = [dict(row) for row in conn.execute(SELECT_NOTES_BY_URL, params)]
+    if include_archived:
+        notes += [dict(row) for row in conn.execute(SELECT_ARCHIVED_NOTES_BY_URL, params)]
+    return notes
+
+
+def _insert_values(values, url, user):
+    """Parameters of INSERT_NOTE, or INSERT_USER_NOTE with a user
+
+    ``values`` are the stored EDITABLE_COLUMNS; the URL key follows them.
+    """
+    values = values + list(urls.url_key(url))
+    return values if user is None else values + [user, user]
+
+
+def create_note(conn, note, user=None):
+    """Insert a note from a dict of editable columns and return it
+
+    ``user`` is recorded as created_by/updated_by; without it the column
+    defaults apply.
+    """
+    values = [_stored(column, note.get(column)) for column in EDITABLE_COLUMNS]
+    cursor = conn.execute(INSERT_NOTE if user is None else INSERT_USER_NOTE,
+                          _insert_values(values, note.get("note_url"), user))
+    conn.commit()
+    return get_note(conn, cursor.lastrowid)
+
+
+def find_or_create_note(conn, note, user=None):
+    """Return (note, created): an existing note with the same URL, or a new one
+
+    URLs are compared normalized, hot notes before archived ones, and with
+    ``user`` only among that user's notes. The lookup and the insert share
+    one write transaction, so concurrent calls for a URL create one note.
+    """
+    if urls.normalize_url(note.get("note_url")) is None:
+        return create_note(conn, note, user), True
+    conn.execute("BEGIN IMMEDIATE")
+    existing = find_notes_by_url(conn, note["note_url"], include_archived=True, user=user)
+    if existing:
+        conn.rollback()
+        return existing[0], False
+    return create_note(conn, note, user), True
+
+
+def _update_statement(columns):
+    """UPDATE for a set of columns; one string per set, so it stays cached
+
+    Takes the columns, :id and :user as named parameters. A user is
+    recorded as updated_by and may only update their own notes.
+    """
+    if "note_url" in columns:
+        columns += tuple(URL_KEY_COLUMNS)
+    assignments = ", ".join(f"{column} = :{column}" for column in columns)
+    return f"""
+        UPDATE my_note
+        SET {assignments}, updated_by = coalesce(:user, updated_by),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = :id AND {OWNED_BY}
+    """
+
+
+def _update_params(note_id, columns, values, user):
+    params = {column: _stored(column, values[column]) for column in columns}
+    if "note_url" in columns:
+        params["note_url_normalized"], params["note_url_hash"] = urls.url_key(values["note_url"])
+    params.update(id=note_id, user=user)
+    return params
+
+
+def update_note(conn, note_id, fields, user=None):
+    """Update the given editable columns of a note and return it
+
+    An archived note is moved back to the hot table first. Returns None
+    if the note does not exist, or with ``user`` if someone else created
+    it. With no fields the note is returned unchanged.
+    """
+    columns = tuple(column for column in EDITABLE_COLUMNS if column in fields)
+    if columns:
+        params = _update_params(note_id, columns, fields, user)
+        cursor = conn.execute(_update_statement(columns), params)
+        conn.commit()
+        if cursor.rowcount == 0:
+            if not restore_note(conn, note_id, user):
+                return None
+            conn.execute(_update_statement(columns), params)
+            conn.commit()
+    return get_note(conn, note_id, include_archived=True, user=user)
+
+
+def delete_note(conn, note_id, user=None):
+    """Delete a note, hot or archived; returns False if it did not exist
+
+    With ``user``, only that user's notes can be deleted.
+    """
+    params = {"id": note_id, "user": user}
+    deleted = conn.execute(f"DELETE FROM my_note WHERE id = :id AND {OWNED_BY}", params).rowcount
+    # Probe the archive before writing to it, so deleting a hot note does
+    # not also write the archive database
+    if _archived(conn, note_id, user):
+        conn.execute(f"DELETE FROM archive.my_note WHERE id = :id AND {OWNED_BY}", params)
+        # The hot table's triggers did not see this one; bump the version
+        conn.execute("INSERT INTO note_changes (note_id) VALUES (?)", (note_id,))
+        deleted = True
+    conn.commit()
+    return bool(deleted)
+
+
+def archive_notes(conn, older_than_days, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move one batch of notes not updated for older_than_days to the archive
+
+    Returns the number of notes moved; call until it returns 0. The copy
+    and the delete are separate commits, since a transaction over two WAL
+    databases is not atomic across both. A note updated in between stays
+    in the hot table and its archived copy is dropped again; until then
+    reads prefer the hot one.
+    """
+    ids = json.dumps([row[0] for row in conn.execute("""
+        SELECT id FROM my_note
+        WHERE updated_at < datetime('now', :age)
+        ORDER BY updated_at LIMIT :limit
+    """, {"age": f"-{older_than_days} days", "limit": batch_size})])
+    # A copy left by an earlier move is deleted rather than replaced, since
+    # REPLACE would not fire the archive's statistics triggers
+    conn.execute("DELETE FROM archive.my_note WHERE id IN (SELECT value FROM json_each(?))",
+                 (ids,))
+    conn.execute(f"""
+        INSERT INTO archive.my_note ({STORED_COLUMNS})
+        SELECT {STORED_COLUMNS} FROM main.my_note
+        WHERE id IN (SELECT value FROM json_each(?))
+    """, (ids,))
+    conn.commit()
+    moved = conn.execute("""
+        DELETE FROM main.my_note
+        WHERE id IN (SELECT value FROM json_each(?))
+          AND updated_at = (SELECT a.updated_at FROM archive.my_note a
+                            WHERE a.id = main.my_note.id)
+    """, (ids,)).rowcount
+    # Notes updated in between stay hot; drop their copies so the
+    # statistics count each note once
+    conn.execute("""
+        DELETE FROM archive.my_note
+        WHERE id IN (SELECT value FROM json_each(?))
+          AND id IN (SELECT id FROM main.my_note)
+    """, (ids,))
+    conn.commit()
+    return moved
+
+
+def restore_note(conn, note_id, user=None):
+    """Move an archived note back to the hot table; False if not archived
+
+    Checks the archive first, so a missing note costs one indexed read
+    rather than two write transactions.
+    """
+    if not _archived(conn, note_id, user):
+        return False
+    params = {"id": note_id, "user": user}
+    cursor = conn.execute(f"""
+        INSERT OR IGNORE INTO main.my_note ({STORED_COLUMNS})
+        SELECT {STORED_COLUMNS} FROM archive.my_note WHERE id = :id AND {OWNED_BY}
+    """, params)
+    conn.commit()
+    found = conn.execute(
+        f"DELETE FROM archive.my_note WHERE id = :id AND {OWNED_BY}", params
+    ).rowcount
+    conn.commit()
+    return bool(cursor.rowcount or found)
+
+
+def archived_count(conn):
+    return conn.execute("SELECT count(*) FROM archive.my_note").fetchone()[0]
+
+
+def apply_changes(conn, updates=(), inserts=(), deletes=(), user=None):
+    """Apply a batch of edits in a single transaction
+
+    ``updates`` is a list of (note_id, {column: value}) pairs, ``inserts`` a
+    list of {column: value} dicts and ``deletes`` a list of note ids.
+    Updates touching the same columns share one executemany call. With
+    ``user``, updates and deletes only touch that user's notes.
+    """
+    grouped = {}
+    for note_id, values in updates:
+        columns = tuple(column for column in EDITABLE_COLUMNS if column in values)
+        grouped.setdefault(columns, []).append(_update_params(note_id, columns, values, user))
+
+    try:
+        for columns, params in grouped.items():
+            if columns:
+                conn.executemany(_update_statement(columns), params)
+        rows = [[_stored(column, row.get(column) or '') for column in EDITABLE_COLUMNS]
+                for row in inserts]
+        conn.executemany(INSERT_NOTE if user is None else INSERT_USER_NOTE,
+                         [_insert_values(values, row.get("note_url"), user)
+                          for values, row in zip(rows, inserts)])
+        conn.executemany(f"DELETE FROM my_note WHERE id = :id AND {OWNED_BY}",
+                         [{"id": note_id, "user": user} for note_id in deletes])
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+
+def get_stats(conn, user=None):
+    """Summary statistics of hot and archived notes, maintained by triggers
+
+    With ``user``, the statistics of the notes that user created.
+    """
+    table, key = ("note_user_stats", "created_by") if user is not None else ("note_stats", "id")
+    return dict(conn.execute(f"""
+        SELECT coalesce(sum(total_notes), 0) AS total_notes,
+               coalesce(sum(with_url), 0) AS with_url,
+               coalesce(sum(with_description), 0) AS with_description,
+               max(last_updated) AS last_updated
+        FROM (SELECT * FROM main.{table} WHERE {key} = :key
+              UNION ALL
+              SELECT * FROM archive.{table} WHERE {key} = :key)
+    """, {"key": 1 if user is None else user}).fetchone())
+
+
+def table_version(conn):
+    """Return (current table version, oldest version still in the change log)
+
+    The oldest version is None while the log is empty.
+    """
+    return tuple(conn.execute(
+        "SELECT coalesce(max(version), 0), min(version) FROM note_changes"
+    ).fetchone())
+
+
+def changed_note_ids(conn, since):
+    """Ids of notes inserted, updated or deleted after table version since"""
+    return [row[0] for row in conn.execute(
+        "SELECT DISTINCT note_id FROM note_changes WHERE version > ?", (since,)
+    )]
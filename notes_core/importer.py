@@ -0,0 +1,165 @@
+"""Streaming bulk import of notes from CSV or NDJSON
+
+Records are parsed one line at a time from a binary file object and
+written in chunked transactions, so memory use does not grow with the
+size of the upload. Only the first MAX_REPORTED_ERRORS bad lines are
+kept for the response; the rest are only counted.
+"""
+import codecs
+import csv
+import json
+import sqlite3
+
+from . import db
+
+# Notes written per transaction
+CHUNK_SIZE = 1000
+
+# Per-line errors kept in the result
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = ("csv", "ndjson")
+
+# Longest CSV field accepted, well above csv's 128 KB default so pasted
+# logs and other long bodies import
+MAX_FIELD_SIZE = 32 * 1024 * 1024
+csv.field_size_limit(max(csv.field_size_limit(), MAX_FIELD_SIZE))
+
+
+def detect_format(filename=None, content_type=None):
+    """Guess the upload format from its file name or content type"""
+    name = (filename or "").lower()
+    kind = (content_type or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in kind or "jsonl" in kind:
+        return "ndjson"
+    if name.endswith(".csv") or "csv" in kind:
+        return "csv"
+    return None
+
+
+class _Lines:
+    """Iterator over the decoded lines of a binary file
+
+    Each line is decoded on its own; one that is not valid UTF-8 is
+    skipped and kept in ``errors`` as (line number, message) until
+    take_errors() is called, so a bad byte fails only its own line.
+    Past MAX_REPORTED_ERRORS waiting errors the rest are only counted,
+    since import_records would not keep them either, so a long run of
+    bad bytes does not pile up. ``line_number`` is the last line read.
+    """
+
+    def __init__(self, binary_file):
+        self.lines = iter(binary_file)
+        self.line_number = 0
+        self.errors = []
+        self.unreported = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while True:
+            raw = next(self.lines)
+            self.line_number += 1
+            if self.line_number == 1:
+                raw = raw.removeprefix(codecs.BOM_UTF8)
+            try:
+                return raw.decode("utf-8")
+            except UnicodeDecodeError as e:
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append((self.line_number, f"Invalid UTF-8: {e.reason}"))
+                else:
+                    self.unreported += 1
+
+    def take_errors(self):
+        """Yield (line number, None, error) for the lines skipped so far"""
+        errors, self.errors = self.errors, []
+        for line, error in errors:
+            yield line, None, error
+        unreported, self.unreported = self.unreported, 0
+        for _ in range(unreported):
+            # Only counted past the reported errors, so the line is not kept
+            yield self.line_number, None, "Invalid UTF-8"
+
+
+def _csv_records(lines):
+    reader = csv.DictReader(lines)
+    while True:
+        try:
+            record = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            # The reader starts afresh on the next line
+            yield lines.line_number, None, str(e)
+            continue
+        yield lines.line_number, record, None
+
+
+def _ndjson_records(lines):
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield lines.line_number, None, f"Invalid JSON: {e.msg}"
+            continue
+        if isinstance(record, dict):
+            yield lines.line_number, record, None
+        else:
+            yield lines.line_number, None, "Expected a JSON object"
+
+
+def iter_records(binary_file, fmt):
+    """Yield (line number, record dict or None, error or None) from the file
+
+    A line that cannot be decoded or parsed is reported and the lines
+    after it are still read.
+    """
+    lines = _Lines(binary_file)
+    parse = _csv_records if fmt == "csv" else _ndjson_records
+    for item in parse(lines):
+        # Undecodable lines were skipped on the way to this record
+        yield from lines.take_errors()
+        yield item
+    yield from lines.take_errors()
+
+
+def import_records(conn, records, validate, user=None):
+    """Validate and insert records in chunks; return the import summary
+
+    ``validate`` turns a record into a dict of note columns or raises
+    ValueError (pydantic's ValidationError is one) with the reason.
+    """
+    result = {"imported": 0, "failed": 0, "errors": []}
+
+    def fail(line, error):
+        result["failed"] += 1
+        if len(result["errors"]) < MAX_REPORTED_ERRORS:
+            result["errors"].append({"line": line, "error": error})
+
+    def flush(chunk):
+        try:
+            db.apply_changes(conn, inserts=[note for _, note in chunk], user=user)
+            result["imported"] += len(chunk)
+        except sqlite3.Error as e:
+            for line, _ in chunk:
+                fail(line, f"Database error: {e}")
+
+    chunk = []
+    for line, record, error in records:
+        if error is not None:
+            fail(line, error)
+            continue
+        try:
+            chunk.append((line, validate(record)))
+        except ValueError as e:
+            fail(line, str(e))
+            continue
+        if len(chunk) >= CHUNK_SIZE:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+    return result
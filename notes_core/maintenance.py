@@ -0,0 +1,200 @@
+"""Periodic database maintenance
+
+run_maintenance() moves notes not updated for NOTES_ARCHIVE_AFTER_DAYS
+to the archive database (when set), refreshes planner statistics with
+PRAGMA optimize, returns free pages left by deletes to the filesystem
+with PRAGMA incremental_vacuum and checkpoints the WAL. The archive database
+is vacuumed too, since restores and deletes free pages there. Archiving
+and vacuuming run in batches and stop once the run's time budget is spent.
+
+The API runs it from a background task, only inside an off-peak window:
+
+    NOTES_MAINTENANCE_WINDOW=02:00-05:00   local time; empty means any hour
+    NOTES_MAINTENANCE_INTERVAL=3600        seconds between runs
+    NOTES_MAINTENANCE_BUDGET=5             seconds of archiving and vacuuming per run
+    NOTES_ARCHIVE_AFTER_DAYS=365           archive notes idle this long; unset keeps all hot
+    NOTES_MAINTENANCE=0                    disables the task
+
+Incremental vacuum needs auto_vacuum=INCREMENTAL, which init_db sets on
+new databases. An existing database and its archive are converted (with
+one full VACUUM each) by
+
+    python -m notes_core.maintenance notes.db --enable-incremental-vacuum
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import os
+import sqlite3
+import time
+
+from . import db
+
+ENABLED = os.environ.get("NOTES_MAINTENANCE", "1") != "0"
+WINDOW = os.environ.get("NOTES_MAINTENANCE_WINDOW", "02:00-05:00")
+INTERVAL = float(os.environ.get("NOTES_MAINTENANCE_INTERVAL", "3600"))
+BUDGET = float(os.environ.get("NOTES_MAINTENANCE_BUDGET", "5"))
+ARCHIVE_AFTER_DAYS = float(os.environ.get("NOTES_ARCHIVE_AFTER_DAYS", "0"))
+
+# Free pages released per incremental_vacuum step
+VACUUM_STEP_PAGES = 256
+
+# Rows sampled per index by PRAGMA optimize, keeping ANALYZE cheap
+ANALYSIS_LIMIT = 1000
+
+AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+# The database and its attached archive (see db.archive_path)
+SCHEMAS = ("main", "archive")
+
+logger = logging.getLogger(__name__)
+
+_reports = {}
+
+
+def parse_window(window):
+    """Turn "HH:MM-HH:MM" into (start, end) minutes after midnight, or None"""
+    if not window:
+        return None
+    start, end = (
+        datetime.datetime.strptime(part.strip(), "%H:%M") for part in window.split("-")
+    )
+    return start.hour * 60 + start.minute, end.hour * 60 + end.minute
+
+
+def in_window(window=None, now=None):
+    """Whether now falls inside the maintenance window; windows may wrap midnight"""
+    bounds = parse_window(WINDOW if window is None else window)
+    if bounds is None:
+        return True
+    now = now or datetime.datetime.now()
+    minute = now.hour * 60 + now.minute
+    start, end = bounds
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end
+
+
+def _pragma(conn, name, schema="main"):
+    return conn.execute(f"PRAGMA {schema}.{name}").fetchone()[0]
+
+
+def _vacuum(conn, schema, deadline):
+    """Release free pages of one schema until deadline if it is incremental"""
+    if _pragma(conn, "auto_vacuum", schema) != 2:
+        return
+    while _pragma(conn, "freelist_count", schema) and time.perf_counter() < deadline:
+        conn.execute(f"PRAGMA {schema}.incremental_vacuum({VACUUM_STEP_PAGES})").fetchall()
+
+
+def run_maintenance(path, budget=None, archive_after_days=None):
+    """Archive, optimize, vacuum and checkpoint the database; return a report dict"""
+    budget = BUDGET if budget is None else budget
+    archive_after_days = ARCHIVE_AFTER_DAYS if archive_after_days is None else archive_after_days
+    started_at = time.time()
+    start = time.perf_counter()
+    with db.get_db(path) as conn:
+        mode = _pragma(conn, "auto_vacuum")
+        pages_before = {schema: _pragma(conn, "page_count", schema) for schema in SCHEMAS}
+
+        archived = 0
+        while archive_after_days and time.perf_counter() - start < budget:
+            moved = db.archive_notes(conn, archive_after_days)
+            archived += moved
+            if not moved:
+                break
+
+        conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        conn.execute("PRAGMA optimize")
+
+        for schema in SCHEMAS:
+            _vacuum(conn, schema, start + budget)
+
+        # A successful TRUNCATE reports (0, 0, 0) because the WAL is empty by
+        # then, so a PASSIVE checkpoint first counts the frames copied back
+        _, _, checkpointed = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        busy, _, _ = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        report = {
+            "started_at": started_at,
+            "seconds": round(time.perf_counter() - start, 3),
+            "auto_vacuum": AUTO_VACUUM_MODES.get(mode, str(mode)),
+            "bytes_reclaimed": 0,
+        }
+        for schema in SCHEMAS:
+            prefix = "" if schema == "main" else f"{schema}_"
+            pages_after = _pragma(conn, "page_count", schema)
+            reclaimed = max(pages_before[schema] - pages_after, 0)
+            report.update({
+                f"{prefix}pages_before": pages_before[schema],
+                f"{prefix}pages_after": pages_after,
+                f"{prefix}pages_reclaimed": reclaimed,
+                f"{prefix}free_pages_left": _pragma(conn, "freelist_count", schema),
+            })
+            report["bytes_reclaimed"] += reclaimed * _pragma(conn, "page_size", schema)
+        report.update({
+            "notes_archived": archived,
+            "wal_pages_checkpointed": max(checkpointed, 0),
+            "checkpoint_complete": not busy,
+        })
+    _reports[path] = report
+    return report
+
+
+def last_report(path):
+    """Report of the most recent maintenance run on path, if any"""
+    return _reports.get(path)
+
+
+async def maintenance_loop(path, interval=None, window=None):
+    """Run maintenance every interval seconds while inside the window"""
+    interval = INTERVAL if interval is None else interval
+    while True:
+        await asyncio.sleep(interval)
+        if not in_window(window):
+            continue
+        try:
+            report = await asyncio.to_thread(run_maintenance, path)
+        except sqlite3.Error as e:
+            logger.warning("Maintenance of %s failed: %s", path, e)
+            continue
+        logger.info(
+            "Maintenance of %s reclaimed %d pages (%d in the archive) in %.2fs",
+            path, report["pages_reclaimed"], report["archive_pages_reclaimed"],
+            report["seconds"],
+        )
+
+
+def enable_incremental_vacuum(path):
+    """Switch an existing database and its archive to auto_vacuum=INCREMENTAL
+
+    Takes effect through a full VACUUM of each, which rewrites the whole
+    file and blocks writers while it runs.
+    """
+    with db.get_db(path) as conn:
+        for schema in SCHEMAS:
+            conn.execute(f"PRAGMA {schema}.auto_vacuum = INCREMENTAL")
+            conn.execute(f"VACUUM {schema}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run database maintenance once")
+    parser.add_argument("database")
+    parser.add_argument("--budget", type=float, default=BUDGET,
+                        help="seconds of archiving and vacuuming")
+    parser.add_argument("--archive-after-days", type=float, default=ARCHIVE_AFTER_DAYS,
+                        help="move notes not updated for this many days to the archive")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="convert the database to auto_vacuum=INCREMENTAL first")
+    args = parser.parse_args()
+
+    if args.enable_incremental_vacuum:
+        enable_incremental_vacuum(args.database)
+    report = run_maintenance(args.database, args.budget, args.archive_after_days)
+    for key, value in report.items():
+        print(f"{key:24}{value}")
+    db.close_pool(args.database)
+
+
+if __name__ == "__main__":
+    main()
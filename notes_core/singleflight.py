@@ -0,0 +1,66 @@
+"""Single-flight coalescing of identical concurrent reads
+
+When several threads ask for the same key at once, the first runs the
+function and the others wait for its result instead of repeating the
+work. Nothing is kept once the call finishes, so this is not a cache:
+callers put the table version in the key and a read that starts after a
+write never shares a result from before it.
+
+NOTES_COALESCE=0 turns coalescing off.
+"""
+import os
+import threading
+
+ENABLED = os.environ.get("NOTES_COALESCE", "1") != "0"
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Group:
+    """Tracks the calls in flight, one per key"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, func):
+        """Return func(), sharing the result with concurrent calls for key"""
+        if not ENABLED:
+            return func()
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def metrics(self):
+        with self._lock:
+            in_flight = len(self._calls)
+        return {"executed": self.executed, "shared": self.shared, "in_flight": in_flight}
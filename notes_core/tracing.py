@@ -0,0 +1,221 @@
+"""Opt-in per-request tracing in the Chrome trace event format
+
+A sampled request gets a trace id (returned in the X-Trace-Id header) and
+records nested spans: the admission wait, connection acquire, every SQL
+statement and commit, and the serialization of the response (from the
+handler returning to the response starting, see TracedRoute). When the
+request finishes its spans are appended, off the event loop, to a local
+JSON file that opens directly in Perfetto (ui.perfetto.dev) or
+chrome://tracing, with one track per request.
+
+    NOTES_TRACE_RATE=0.1            fraction of requests traced; 0 (default) disables tracing
+    NOTES_TRACE_FILE=traces.json    where traces are appended
+
+The file is a JSON array left open at the end, which the format allows,
+so traces can be appended without rewriting it.
+
+    app.add_middleware(TracingMiddleware)
+    router = APIRouter(route_class=TracedRoute)
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from fastapi.routing import APIRoute
+
+RATE = float(os.environ.get("NOTES_TRACE_RATE", "0"))
+ENABLED = RATE > 0
+TRACE_FILE = os.environ.get("NOTES_TRACE_FILE", "traces.json")
+
+# Longest SQL text kept in a span
+MAX_SQL_LENGTH = 500
+
+_current = contextvars.ContextVar("notes_trace", default=None)
+_tracks = itertools.count(1)
+_file_lock = threading.Lock()
+
+
+class Trace:
+    """Spans recorded for one request"""
+
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex[:16]
+        self.track = next(_tracks)
+        self.pid = os.getpid()
+        self.handler_done = None
+        self.events = [{
+            "name": "thread_name", "ph": "M", "pid": self.pid, "tid": self.track,
+            "args": {"name": f"{name} [{self.id}]"},
+        }]
+
+    def add(self, name, category, start_ns, end_ns, args):
+        self.events.append({
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": start_ns / 1000,
+            "dur": (end_ns - start_ns) / 1000,
+            "pid": self.pid,
+            "tid": self.track,
+            "args": args,
+        })
+
+
+class _Span:
+    def __init__(self, trace, name, category, args):
+        self.trace = trace
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.trace.add(self.name, self.category, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+
+class _NoSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name, category="notes", **args):
+    """Context manager timing a span of the current trace; a no-op untraced"""
+    trace = _current.get()
+    if trace is None:
+        return _NO_SPAN
+    return _Span(trace, name, category, args)
+
+
+def _sql_span(sql):
+    text = " ".join(sql.split())
+    verb = text.split(" ", 1)[0].upper() if text else "SQL"
+    return span(verb, "sql", sql=text[:MAX_SQL_LENGTH])
+
+
+class TracedConnection(sqlite3.Connection):
+    """Connection recording a span per statement and commit of traced requests
+
+    Spans cover running a statement up to its first row; rows fetched
+    later are timed by the caller's own spans.
+    """
+
+    def execute(self, sql, parameters=(), /):
+        if _current.get() is None:
+            return super().execute(sql, parameters)
+        with _sql_span(sql):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql, parameters, /):
+        if _current.get() is None:
+            return super().executemany(sql, parameters)
+        with _sql_span(sql):
+            return super().executemany(sql, parameters)
+
+    def commit(self):
+        if _current.get() is None:
+            return super().commit()
+        with span("COMMIT", "sql"):
+            return super().commit()
+
+
+def _handler_done():
+    trace = _current.get()
+    if trace is not None:
+        trace.handler_done = time.perf_counter_ns()
+
+
+def _timed_endpoint(endpoint):
+    """Wrap a route endpoint to note when it returns, keeping its signature"""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def timed(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _handler_done()
+    else:
+        @functools.wraps(endpoint)
+        def timed(*args, **kwargs):
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                _handler_done()
+    return timed
+
+
+class TracedRoute(APIRoute):
+    """Route noting when its endpoint returns, for the serialize response span
+
+    What follows (response model validation and JSON encoding) is
+    FastAPI's, so TracingMiddleware times it up to the response start.
+    Endpoints are left unwrapped while tracing is disabled.
+    """
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint) if ENABLED else endpoint, **kwargs)
+
+
+def write(trace, path=None):
+    """Append a finished trace's events to the trace file"""
+    path = path or TRACE_FILE
+    lines = "".join(json.dumps(event, separators=(",", ":")) + ",\n" for event in trace.events)
+    with _file_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            if f.tell() == 0:
+                f.write("[\n")
+            f.write(lines)
+
+
+class TracingMiddleware:
+    """ASGI middleware tracing a sample of requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not ENABLED or scope["type"] != "http" or random.random() >= RATE:
+            await self.app(scope, receive, send)
+            return
+
+        name = f"{scope['method']} {scope['path']}"
+        trace = Trace(name)
+        args = {"trace_id": trace.id, "query": scope.get("query_string", b"").decode("latin-1")}
+
+        async def traced_send(message):
+            if message["type"] == "http.response.start":
+                if trace.handler_done is not None:
+                    trace.add("serialize response", "notes", trace.handler_done,
+                              time.perf_counter_ns(), {})
+                args["status"] = message["status"]
+                message["headers"] = [*message.get("headers", []),
+                                      (b"x-trace-id", trace.id.encode())]
+            await send(message)
+
+        token = _current.set(trace)
+        try:
+            with _Span(trace, name, "request", args):
+                await self.app(scope, receive, traced_send)
+        finally:
+            _current.reset(token)
+            await asyncio.to_thread(write, trace)
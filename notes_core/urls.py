@@ -0,0 +1,90 @@
+"""Normalized note URLs for duplicate detection and lookup by link
+
+Two links to the same page are stored differently often enough to defeat
+an exact match: ``HTTPS://Example.com/a/`` and ``https://example.com/a?utm_source=x``
+are one bookmark. normalize_url() reduces a URL to a key by
+
+    lowercasing the scheme and host and dropping the default port
+    removing tracking parameters (utm_*, fbclid, gclid, ...)
+    stripping trailing slashes from the path
+
+and url_hash() turns the key into a 64-bit integer that db indexes, so a
+lookup is one index probe however many notes there are. Text that does
+not parse as a URL is kept as it is, so it can still be matched exactly:
+
+    >>> normalize_url("HTTPS://Example.com/a/?utm_source=x&id=3")
+    'https://example.com/a?id=3'
+    >>> normalize_url(" http://[::1 ")
+    'http://[::1'
+    >>> url_key("")
+    (None, None)
+
+    python -m doctest notes_core/urls.py
+"""
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = frozenset({
+    "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "twclid",
+    "igshid", "mc_cid", "mc_eid", "_ga", "_gl", "ref_src", "ref_url",
+})
+TRACKING_PREFIXES = ("utm_",)
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def _is_tracking(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def normalize_url(url):
+    """Normalized form of url, or None if it is empty
+
+    urlsplit() rejects some inputs, such as an unclosed IPv6 bracket; those
+    are returned stripped but otherwise unchanged.
+    """
+    url = (url or "").strip()
+    if not url:
+        return None
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+
+    netloc = parts.netloc
+    if parts.hostname is not None:
+        host = parts.hostname
+        if ":" in host:
+            host = f"[{host}]"
+        try:
+            port = parts.port
+        except ValueError:
+            # Not a number; keep it so the link stays distinct from the bare host
+            port = netloc.rpartition("@")[2].rpartition(":")[2]
+        if port is not None and port != DEFAULT_PORTS.get(scheme):
+            host = f"{host}:{port}"
+        userinfo = netloc.rpartition("@")[0]
+        netloc = f"{userinfo}@{host}" if userinfo else host
+
+    query = urlencode(
+        [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+         if not _is_tracking(name)]
+    )
+    return urlunsplit((scheme, netloc, parts.path.rstrip("/"), query, parts.fragment))
+
+
+def url_hash(normalized):
+    """Signed 64-bit hash of a normalized URL, as stored in SQLite"""
+    digest = hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def url_key(url):
+    """(normalized URL, hash) for url, or (None, None) if it is empty"""
+    normalized = normalize_url(url)
+    if normalized is None:
+        return None, None
+    return normalized, url_hash(normalized)
@@ -0,0 +1,195 @@
+"""Headless rerun benchmark of st_note.py using Streamlit's AppTest
+
+Seeds a database of each size and drives the app through a scripted
+session (search, select, edit, delete, paging), recording for every step
+the wall time of the reruns it triggers and the peak memory allocated
+while it runs. Memory is measured with tracemalloc in a second pass over
+a fresh copy of the database, so tracing does not inflate the timings.
+
+    python bench_apptest.py                           # 1k and 10k notes
+    python bench_apptest.py 1000 100000
+    python bench_apptest.py --budget-ms 500 --budget search=200 --budget-mb 200
+
+With budgets set, steps over budget are flagged and the run exits with
+status 1, so the benchmark can gate CI.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import st_note
+from notes_core import backup, bench, db
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "st_note.py")
+
+# Seconds AppTest waits for one rerun
+RERUN_TIMEOUT = 300
+
+
+def by_label(widgets, label):
+    return next(widget for widget in widgets if widget.label == label)
+
+
+def first_note_id(at):
+    """Id of the first note offered in the Actions panel"""
+    label = by_label(at.multiselect, "Select note to edit").options[0]
+    return int(label.split(":")[0].removeprefix("ID "))
+
+
+def search(at):
+    by_label(at.text_input, "Search notes").set_value("note 12").run()
+
+
+def clear_search(at):
+    by_label(at.text_input, "Search notes").set_value("").run()
+
+
+def select_note(at):
+    by_label(at.multiselect, "Select note to edit").set_value([first_note_id(at)]).run()
+
+
+def open_editor(at):
+    by_label(at.button, "✏️ Edit Selected").click().run()
+
+
+def update_note(at):
+    by_label(at.sidebar.text_input, "Note Name *").set_value("edited in benchmark")
+    by_label(at.sidebar.button, "💾 Update Note").click().run()
+
+
+def edit_table(at):
+    at.session_state["notes_editor"] = {
+        "edited_rows": {0: {"note_name": "edited in table"}}, "added_rows": [], "deleted_rows": [],
+    }
+    at.run()
+
+
+def save_table(at):
+    next(button for button in at.button if "Save" in button.label).click().run()
+
+
+def delete_note(at):
+    by_label(at.selectbox, "Select note to delete").set_value(first_note_id(at)).run()
+    # The first click asks for confirmation, the second deletes
+    by_label(at.button, "🗑️ Delete Note").click().run()
+    by_label(at.button, "🗑️ Delete Note").click().run()
+
+
+def paginate(at):
+    at.toggle(key="paginated_view").set_value(True).run()
+
+
+def next_page(at):
+    by_label(at.button, "Next ➡️").click().run()
+
+
+STEPS = [
+    ("first load", lambda at: at.run()),
+    ("rerun", lambda at: at.run()),
+    ("search", search),
+    ("clear search", clear_search),
+    ("select note", select_note),
+    ("open editor", open_editor),
+    ("update note", update_note),
+    ("edit table", edit_table),
+    ("save table", save_table),
+    ("delete note", delete_note),
+    ("paginated view", paginate),
+    ("next page", next_page),
+]
+
+
+def run_session(seeded, workdir, measure_memory):
+    """Run every step on a fresh copy of the seeded database
+
+    Returns {step: seconds} or {step: peak bytes}.
+    """
+    os.makedirs(workdir)
+    # Backup API copy, so rows still in the seed's WAL come along
+    backup.run_backup(seeded, os.path.join(workdir, st_note.DATABASE_URL))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    at = AppTest.from_file(APP_PATH, default_timeout=RERUN_TIMEOUT)
+    results = {}
+    try:
+        for name, step in STEPS:
+            if measure_memory:
+                tracemalloc.start()
+                step(at)
+                results[name] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            else:
+                start = time.perf_counter()
+                step(at)
+                results[name] = time.perf_counter() - start
+            if at.exception:
+                raise RuntimeError(f"{name}: {at.exception[0].message}")
+    finally:
+        os.chdir(cwd)
+        # Start the next session cold; the script's cached functions are
+        # not the ones imported here, so clear every resource cache
+        st.cache_resource.clear()
+        # Pooled under the app's relative path, which the next session reuses
+        db.close_pool(st_note.DATABASE_URL)
+    return results
+
+
+def parse_budgets(values):
+    budgets = {}
+    for value in values:
+        step, _, ms = value.partition("=")
+        if step not in dict(STEPS):
+            raise SystemExit(f"Unknown step {step!r}; steps are {', '.join(dict(STEPS))}")
+        budgets[step] = float(ms)
+    return budgets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark st_note.py reruns with AppTest")
+    parser.add_argument("sizes", nargs="*", type=int, default=[1_000, 10_000])
+    parser.add_argument("--budget-ms", type=float, help="wall time budget per step")
+    parser.add_argument("--budget", action="append", default=[], metavar="STEP=MS",
+                        help="wall time budget for one step, overriding --budget-ms")
+    parser.add_argument("--budget-mb", type=float, help="peak memory budget per step")
+    args = parser.parse_args()
+    budgets = parse_budgets(args.budget)
+
+    over = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            seeded = os.path.join(tmp, f"seed_{n}.db")
+            bench.seed(seeded, n, lambda i: st_note.DATABASE_USER)
+            db.close_pool(seeded)
+            times = run_session(seeded, os.path.join(tmp, f"time_{n}"), measure_memory=False)
+            peaks = run_session(seeded, os.path.join(tmp, f"memory_{n}"), measure_memory=True)
+
+            print(f"\n{n:,} notes")
+            print(f"  {'step':18}{'rerun ms':>10}{'peak MB':>10}")
+            for name, _ in STEPS:
+                ms = times[name] * 1000
+                mb = peaks[name] / 1e6
+                budget_ms = budgets.get(name, args.budget_ms)
+                flags = []
+                if budget_ms is not None and ms > budget_ms:
+                    flags.append(f"over {budget_ms:g} ms")
+                if args.budget_mb is not None and mb > args.budget_mb:
+                    flags.append(f"over {args.budget_mb:g} MB")
+                if flags:
+                    over.append(f"{n:,} notes, {name}: {', '.join(flags)}")
+                print(f"  {name:18}{ms:10.0f}{mb:10.1f}  {'; '.join(flags)}")
+
+    if over:
+        print("\nBudget exceeded:")
+        for line in over:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
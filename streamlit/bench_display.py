@@ -0,0 +1,118 @@
+"""Benchmark the per-rerun display pipeline of st_note.py
+
+Compares the original pipeline (copy, per-rerun timestamp parsing,
+per-row truncation, a DataFrame mask per option label) with the
+vectorized view model built by build_view().
+
+    python bench_display.py                # 10k and 100k notes
+    python bench_display.py 1000 50000     # custom sizes
+
+The original option labels are O(n^2), so they are timed on a sample of
+options and extrapolated to the full list.
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import st_note
+
+LABEL_SAMPLE = 200
+
+
+def seed(path, n):
+    """Create a notes database with n rows of mixed-length text"""
+    st_note.DATABASE_URL = path
+    st_note.init_db()
+    rng = random.Random(n)
+    rows = [
+        (
+            f"note {i}",
+            "lorem ipsum " * rng.randint(0, 40),
+            f"https://example.com/{i}" if i % 3 else "",
+            "comment " * rng.randint(0, 12),
+            f"2025-{1 + i % 12:02d}-{1 + i % 28:02d} {i % 24:02d}:{i % 60:02d}:{(i * 7) % 60:02d}",
+        )
+        for i in range(n)
+    ]
+    with sqlite3.connect(path) as conn:
+        conn.executemany("""
+            INSERT INTO my_note (note_name, note_description, note_url, note_comment, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, rows)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def legacy_rerun(df):
+    """The display steps as they ran on every rerun before the view model"""
+    filtered_df = df.copy()
+    display_df = filtered_df.copy()
+    display_df['created_at'] = pd.to_datetime(display_df['created_at']).dt.strftime('%m/%d/%y %H:%M')
+    display_df['updated_at'] = pd.to_datetime(display_df['updated_at']).dt.strftime('%m/%d/%y %H:%M')
+    display_df['note_description'] = display_df['note_description'].apply(
+        lambda x: (x[:100] + '...') if pd.notna(x) and len(str(x)) > 100 else x
+    )
+    display_df['note_comment'] = display_df['note_comment'].apply(
+        lambda x: (x[:50] + '...') if pd.notna(x) and len(str(x)) > 50 else x
+    )
+    return filtered_df
+
+
+def legacy_labels(filtered_df, ids):
+    return [f"ID {x}: {filtered_df[filtered_df['id']==x]['note_name'].iloc[0][:30]}..." for x in ids]
+
+
+def view_rerun(df):
+    return st_note.build_view(df)
+
+
+def view_labels(note_names):
+    return [f"ID {x}: {note_names[x][:30]}..." for x in note_names]
+
+
+def bench(n):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench_notes.db")
+        seed(path, n)
+        query = """
+            SELECT id, note_name, note_description, note_url, note_comment,
+                   created_at, updated_at, created_by, updated_by
+            FROM my_note
+            ORDER BY updated_at DESC
+        """
+        with sqlite3.connect(path) as conn:
+            raw_df = pd.read_sql_query(query, conn)
+            load_time, typed_df = timed(lambda: st_note.read_notes(conn.execute(query)))
+
+    legacy_time, filtered_df = timed(legacy_rerun, raw_df)
+    sample = filtered_df['id'].tolist()[:LABEL_SAMPLE]
+    sample_time, _ = timed(legacy_labels, filtered_df, sample)
+    legacy_label_time = sample_time * n / len(sample)
+
+    view_time, (_, note_names) = timed(view_rerun, typed_df)
+    label_time, _ = timed(view_labels, note_names)
+
+    print(f"\n{n:,} notes")
+    print(f"  load + parse timestamps (once per version): {load_time * 1000:9.1f} ms")
+    print(f"  {'':26}{'original':>14}{'view model':>14}")
+    print(f"  {'display frame':26}{legacy_time * 1000:11.1f} ms{view_time * 1000:11.1f} ms")
+    print(f"  {'option labels (x2 lists)':26}{2 * legacy_label_time * 1000:11.1f} ms{2 * label_time * 1000:11.1f} ms")
+    total_legacy = legacy_time + 2 * legacy_label_time
+    total_view = view_time + 2 * label_time
+    print(f"  {'rerun total':26}{total_legacy * 1000:11.1f} ms{total_view * 1000:11.1f} ms"
+          f"  ({total_legacy / total_view:,.0f}x)")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for size in sizes:
+        bench(size)
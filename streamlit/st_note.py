@@ -2,8 +2,13 @@ import streamlit as st
 import sqlite3
 import pandas as pd
 from datetime import datetime
-from contextlib import contextmanager
 import os
+import sys
+import threading
+
+# Make the shared notes_core package importable when run from this directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from notes_core import db as notes_db
 
 # Page configuration
 st.set_page_config(
@@ -16,33 +21,43 @@ st.set_page_config(
 # Database setup
 DATABASE_URL = "streamlit_notes.db"
 
-@contextmanager
+# Recorded as created_by/updated_by on notes written from this app, which
+# only shows and edits this user's notes
+DATABASE_USER = "streamlit_user"
+
+# Page sizes offered in paginated view
+PAGE_SIZES = [25, 50, 100, 250]
+
+# Read as strings so all-NULL columns stay editable as text
+TEXT_DTYPES = {
+    'note_name': 'string',
+    'note_description': 'string',
+    'note_url': 'string',
+    'note_comment': 'string',
+}
+
+# Timestamps are parsed once when rows are read, not on every rerun
+TIMESTAMP_COLUMNS = {
+    'created_at': 'ISO8601',
+    'updated_at': 'ISO8601',
+}
+
+# Display truncation widths for long text columns
+PREVIEW_WIDTHS = {
+    'note_description': 100,
+    'note_comment': 50,
+}
+
+# Columns the table editor may write back
+EDITABLE_COLUMNS = notes_db.EDITABLE_COLUMNS
+
 def get_db():
     """Database connection context manager"""
-    conn = sqlite3.connect(DATABASE_URL)
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    finally:
-        conn.close()
+    return notes_db.get_db(DATABASE_URL)
 
 def init_db():
     """Initialize the database with the notes table"""
-    with sqlite3.connect(DATABASE_URL) as conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS my_note (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                note_name TEXT NOT NULL,
-                note_description TEXT,
-                note_url TEXT,
-                note_comment TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                created_by TEXT DEFAULT 'streamlit_user',
-                updated_by TEXT DEFAULT 'streamlit_user'
-            )
-        """)
-        conn.commit()
+    notes_db.init_db(DATABASE_URL)
 
 # Initialize session state
 def init_session_state():
@@ -58,62 +73,200 @@ def init_session_state():
             'note_url': '',
             'note_comment': ''
         }
+    if 'page_cursors' not in st.session_state:
+        # Keyset of the last row on each previous page; None starts at the top
+        st.session_state.page_cursors = [None]
+        st.session_state.page_filters = None
+
+def read_notes(cursor):
+    """Read a notes cursor into a DataFrame with typed text and timestamp columns"""
+    cursor.row_factory = None
+    columns = [column[0] for column in cursor.description]
+    df = pd.DataFrame.from_records(cursor.fetchall(), columns=columns).astype(TEXT_DTYPES)
+    for column, date_format in TIMESTAMP_COLUMNS.items():
+        df[column] = pd.to_datetime(df[column], format=date_format)
+    return df
+
+class NotesCache:
+    """Whole-table notes DataFrame kept in step with the note_changes log
+
+    The cached frame is tagged with the table version it reflects. On each
+    read the current version is compared, and only the notes written since
+    then are re-read and patched into the frame, whichever process wrote
+    them. The frame is replaced, never mutated, so callers may hold on to it.
+    Only the notes created by ``user`` are kept.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.lock = threading.Lock()
+        self.df = None
+        self.version = None
+
+    def invalidate(self):
+        """Force a full reload on the next read"""
+        with self.lock:
+            self.df = None
+            self.version = None
+
+    def snapshot(self):
+        """Return the notes frame as of the current table version"""
+        with self.lock, get_db() as conn:
+            # One read transaction so the version matches the rows we read
+            conn.execute("BEGIN")
+            version, oldest = notes_db.table_version(conn)
+            if self.df is None or (oldest is not None and self.version + 1 < oldest):
+                self.df = read_notes(notes_db.list_notes(conn, user=self.user))
+            elif version != self.version:
+                self.df = self._apply_changes(conn, self.df, self.version)
+            self.version = version
+            conn.rollback()
+            return self.df
+
+    def _apply_changes(self, conn, df, since):
+        changed_ids = notes_db.changed_note_ids(conn, since)
+        changed = read_notes(notes_db.list_notes(conn, changed_since=since, user=self.user))
+        # Drop every touched id (updated or deleted), then add back current rows
+        df = df[~df['id'].isin(changed_ids)]
+        df = pd.concat([changed, df], ignore_index=True)
+        if not df['updated_at'].is_monotonic_decreasing:
+            df = df.sort_values('updated_at', ascending=False, kind='stable', ignore_index=True)
+        return df
+
+@st.cache_resource
+def get_notes_cache(user):
+    """Notes cache of one user, shared by every session in this process"""
+    return NotesCache(user)
 
-@st.cache_data
 def load_notes():
-    """Load all notes from database with caching"""
+    """Load all notes from the shared, incrementally maintained cache"""
+    return get_notes_cache(DATABASE_USER).snapshot()
+
+def load_notes_page(search_term='', only_with_url=False, after=None, limit=None):
+    """Load notes with filtering and keyset pagination pushed down to SQLite
+
+    ``after`` is the (updated_at, id) key of the last row on the previous
+    page, so each page is an index range scan instead of an OFFSET skip.
+    """
     with get_db() as conn:
-        query = """
-            SELECT id, note_name, note_description, note_url, note_comment,
-                   created_at, updated_at, created_by, updated_by
-            FROM my_note 
-            ORDER BY updated_at DESC
-        """
-        df = pd.read_sql_query(query, conn)
-        return df
+        return read_notes(notes_db.list_notes(
+            conn, search=search_term, only_with_url=only_with_url, after=after, limit=limit,
+            user=DATABASE_USER
+        ))
+
+def build_view(df):
+    """Build the display frame and the id-indexed note name lookup
+
+    Only values longer than their preview width are rewritten, with
+    vectorized string operations. The name lookup keeps the display order
+    and serves the option labels of the Actions panel in O(1) per option.
+    """
+    # Range index so data_editor can hide it and still add rows
+    view = df.reset_index(drop=True)
+    for column, width in PREVIEW_WIDTHS.items():
+        values = view[column]
+        long = values.str.len().gt(width).fillna(False)
+        if long.any():
+            view.loc[long, column] = values[long].str.slice(0, width) + '...'
+    names = dict(zip(view['id'].tolist(), view['note_name'].tolist()))
+    return view, names
+
+def next_page(after):
+    """Advance the paginated view past the given row key"""
+    st.session_state.page_cursors.append(after)
+
+def previous_page():
+    """Step the paginated view back one page"""
+    if len(st.session_state.page_cursors) > 1:
+        st.session_state.page_cursors.pop()
 
 def create_note(note_name, note_description, note_url, note_comment):
     """Create a new note"""
     with get_db() as conn:
-        conn.execute("""
-            INSERT INTO my_note (note_name, note_description, note_url, note_comment)
-            VALUES (?, ?, ?, ?)
-        """, (note_name, note_description, note_url, note_comment))
-        conn.commit()
-    # Clear cache to refresh data
-    load_notes.clear()
+        notes_db.create_note(conn, {
+            'note_name': note_name,
+            'note_description': note_description,
+            'note_url': note_url,
+            'note_comment': note_comment,
+        }, user=DATABASE_USER)
 
 def update_note(note_id, note_name, note_description, note_url, note_comment):
     """Update an existing note"""
     with get_db() as conn:
-        conn.execute("""
-            UPDATE my_note 
-            SET note_name = ?, note_description = ?, note_url = ?, note_comment = ?,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        """, (note_name, note_description, note_url, note_comment, note_id))
-        conn.commit()
-    # Clear cache to refresh data
-    load_notes.clear()
+        notes_db.update_note(conn, note_id, {
+            'note_name': note_name,
+            'note_description': note_description,
+            'note_url': note_url,
+            'note_comment': note_comment,
+        }, user=DATABASE_USER)
 
 def delete_note(note_id):
     """Delete a note"""
     with get_db() as conn:
-        conn.execute("DELETE FROM my_note WHERE id = ?", (note_id,))
-        conn.commit()
-    # Clear cache to refresh data
-    load_notes.clear()
+        notes_db.delete_note(conn, note_id, user=DATABASE_USER)
+
+def save_editor_changes(full_df):
+    """Persist the pending data_editor diff for the rows shown in full_df
+
+    Runs as the save button's callback, so the batch is committed before
+    the single rerun that follows. Cells shown as truncated previews are
+    not written back, since their edited text would replace the full body.
+    """
+    changes = st.session_state.get('notes_editor') or {}
+    ids = full_df['id'].tolist()
+    updates, inserts, deletes, skipped = [], [], [], []
+    
+    for position, edits in changes.get('edited_rows', {}).items():
+        row = full_df.iloc[int(position)]
+        values = {}
+        for column, value in edits.items():
+            if column not in EDITABLE_COLUMNS:
+                continue
+            full_value = row[column]
+            width = PREVIEW_WIDTHS.get(column)
+            if width and pd.notna(full_value) and len(full_value) > width:
+                skipped.append(f"ID {row['id']} {column}")
+                continue
+            if column == 'note_name' and not (value or '').strip():
+                skipped.append(f"ID {row['id']} note_name (required)")
+                continue
+            values[column] = value or ''
+        if values:
+            updates.append((ids[int(position)], values))
+    
+    for row in changes.get('added_rows', []):
+        if (row.get('note_name') or '').strip():
+            inserts.append(row)
+        else:
+            skipped.append("new row without a name")
+    
+    deletes = [ids[int(position)] for position in changes.get('deleted_rows', [])]
+    
+    try:
+        with get_db() as conn:
+            notes_db.apply_changes(conn, updates, inserts, deletes, user=DATABASE_USER)
+    except sqlite3.Error as e:
+        st.session_state.editor_message = ('error', f"Error saving table changes: {str(e)}")
+        return
+    
+    # Start the editor from the saved data
+    del st.session_state['notes_editor']
+    message = f"Saved {len(updates)} updated, {len(inserts)} added, {len(deletes)} deleted"
+    if skipped:
+        message += f" — skipped {', '.join(skipped)}; use the sidebar form for long text"
+        st.session_state.editor_message = ('warning', f"⚠️ {message}")
+    else:
+        st.session_state.editor_message = ('success', f"✅ {message}")
 
 def get_note_by_id(note_id):
     """Get a specific note by ID"""
     with get_db() as conn:
-        cursor = conn.execute("""
-            SELECT id, note_name, note_description, note_url, note_comment,
-                   created_at, updated_at, created_by, updated_by
-            FROM my_note WHERE id = ?
-        """, (note_id,))
-        result = cursor.fetchone()
-        return dict(result) if result else None
+        return notes_db.get_note(conn, note_id, user=DATABASE_USER)
+
+def get_note_stats():
+    """Get summary statistics maintained by triggers on my_note"""
+    with get_db() as conn:
+        return notes_db.get_stats(conn, DATABASE_USER)
 
 def reset_form():
     """Reset form and session state"""
@@ -143,9 +296,6 @@ def main():
         </div>
     """, unsafe_allow_html=True)
     
-    # Load notes data
-    df = load_notes()
-    
     # Sidebar for form
     with st.sidebar:
         st.markdown("### 📝 Note Form")
@@ -237,26 +387,25 @@ def main():
     st.markdown("### 📊 Notes Database")
     
     # Stats
+    stats = get_note_stats()
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Total Notes", len(df))
+        st.metric("Total Notes", stats['total_notes'])
     with col2:
-        notes_with_url = len(df[df['note_url'].notna() & (df['note_url'] != '')])
-        st.metric("With URLs", notes_with_url)
+        st.metric("With URLs", stats['with_url'])
     with col3:
-        notes_with_desc = len(df[df['note_description'].notna() & (df['note_description'] != '')])
-        st.metric("With Description", notes_with_desc)
+        st.metric("With Description", stats['with_description'])
     with col4:
-        if len(df) > 0:
-            latest_date = pd.to_datetime(df['updated_at']).max().strftime('%m/%d/%y')
+        if stats['last_updated']:
+            latest_date = datetime.fromisoformat(stats['last_updated']).strftime('%m/%d/%y')
             st.metric("Last Updated", latest_date)
         else:
             st.metric("Last Updated", "N/A")
     
-    if len(df) > 0:
+    if stats['total_notes'] > 0:
         # Search and filter
         st.markdown("#### 🔍 Search & Filter")
-        col1, col2 = st.columns([3, 1])
+        col1, col2, col3 = st.columns([3, 1, 1])
         
         with col1:
             search_term = st.text_input(
@@ -268,38 +417,63 @@ def main():
         with col2:
             show_only_with_url = st.checkbox("Only show notes with URLs")
         
-        # Filter dataframe
-        filtered_df = df.copy()
+        with col3:
+            paginated = st.toggle("Paginated view", key="paginated_view")
         
-        if search_term:
-            mask = (
-                filtered_df['note_name'].str.contains(search_term, case=False, na=False) |
-                filtered_df['note_description'].str.contains(search_term, case=False, na=False) |
-                filtered_df['note_comment'].str.contains(search_term, case=False, na=False)
+        if paginated:
+            # Only the visible page is queried; filtering runs in SQLite
+            col1, col2, col3 = st.columns([3, 1, 1])
+            with col1:
+                page_size = st.selectbox("Page size", PAGE_SIZES, key="page_size")
+            
+            # Go back to the first page whenever the filters change
+            page_filters = (search_term, show_only_with_url, page_size)
+            if st.session_state.page_filters != page_filters:
+                st.session_state.page_filters = page_filters
+                st.session_state.page_cursors = [None]
+            cursors = st.session_state.page_cursors
+            
+            # Fetch one extra row to learn whether a next page exists
+            filtered_df = load_notes_page(
+                search_term, show_only_with_url, after=cursors[-1], limit=page_size + 1
             )
-            filtered_df = filtered_df[mask]
-        
-        if show_only_with_url:
-            filtered_df = filtered_df[filtered_df['note_url'].notna() & (filtered_df['note_url'] != '')]
-        
-        st.markdown(f"#### 📋 Notes Table ({len(filtered_df)} records)")
+            has_next = len(filtered_df) > page_size
+            filtered_df = filtered_df.iloc[:page_size]
+            
+            with col2:
+                st.button("⬅️ Previous", on_click=previous_page, disabled=len(cursors) == 1)
+            with col3:
+                last_key = None
+                if has_next:
+                    last = filtered_df.iloc[-1]
+                    last_key = (last['updated_at'].strftime('%Y-%m-%d %H:%M:%S'), int(last['id']))
+                st.button("Next ➡️", on_click=next_page, args=(last_key,), disabled=not has_next)
+            
+            st.markdown(f"#### 📋 Notes Table (page {len(cursors)}, {len(filtered_df)} records)")
+        else:
+            # Load notes data
+            df = load_notes()
+            
+            # Filter dataframe
+            filtered_df = df
+            
+            if search_term:
+                mask = (
+                    filtered_df['note_name'].str.contains(search_term, case=False, na=False) |
+                    filtered_df['note_description'].str.contains(search_term, case=False, na=False) |
+                    filtered_df['note_comment'].str.contains(search_term, case=False, na=False)
+                )
+                filtered_df = filtered_df[mask]
+            
+            if show_only_with_url:
+                filtered_df = filtered_df[filtered_df['note_url'].notna() & (filtered_df['note_url'] != '')]
+            
+            st.markdown(f"#### 📋 Notes Table ({len(filtered_df)} records)")
         
         # Display dataframe with selection
         if len(filtered_df) > 0:
-            # Create display dataframe with formatted columns
-            display_df = filtered_df.copy()
-            
-            # Format timestamps
-            display_df['created_at'] = pd.to_datetime(display_df['created_at']).dt.strftime('%m/%d/%y %H:%M')
-            display_df['updated_at'] = pd.to_datetime(display_df['updated_at']).dt.strftime('%m/%d/%y %H:%M')
-            
-            # Truncate long text for better display
-            display_df['note_description'] = display_df['note_description'].apply(
-                lambda x: (x[:100] + '...') if pd.notna(x) and len(str(x)) > 100 else x
-            )
-            display_df['note_comment'] = display_df['note_comment'].apply(
-                lambda x: (x[:50] + '...') if pd.notna(x) and len(str(x)) > 50 else x
-            )
+            # Display frame with truncated text, plus id-indexed name lookup
+            display_df, note_names = build_view(filtered_df)
             
             # Column configuration for better display
             column_config = {
@@ -308,8 +482,8 @@ def main():
                 "note_description": st.column_config.TextColumn("Description", width="large"),
                 "note_url": st.column_config.LinkColumn("URL", width="medium"),
                 "note_comment": st.column_config.TextColumn("Comment", width="medium"),
-                "created_at": st.column_config.DatetimeColumn("Created", width="small"),
-                "updated_at": st.column_config.DatetimeColumn("Updated", width="small"),
+                "created_at": st.column_config.DatetimeColumn("Created", format="MM/DD/YY HH:mm", width="small"),
+                "updated_at": st.column_config.DatetimeColumn("Updated", format="MM/DD/YY HH:mm", width="small"),
             }
             
             # Data editor for selection and editing
@@ -317,11 +491,30 @@ def main():
                 display_df,
                 column_config=column_config,
                 use_container_width=True,
+                hide_index=True,
                 num_rows="dynamic",
                 disabled=["id", "created_at", "updated_at", "created_by", "updated_by"],
                 key="notes_editor"
             )
             
+            # Save pending table edits as one batch
+            pending = st.session_state.get('notes_editor') or {}
+            pending_count = (
+                len(pending.get('edited_rows', {})) +
+                len(pending.get('added_rows', [])) +
+                len(pending.get('deleted_rows', []))
+            )
+            if pending_count:
+                st.button(
+                    f"💾 Save {pending_count} table change(s)",
+                    type="primary",
+                    on_click=save_editor_changes,
+                    args=(filtered_df,)
+                )
+            if 'editor_message' in st.session_state:
+                level, message = st.session_state.pop('editor_message')
+                getattr(st, level)(message)
+            
             # Action buttons
             st.markdown("#### ⚡ Actions")
             col1, col2, col3, col4 = st.columns(4)
@@ -330,8 +523,8 @@ def main():
             with col1:
                 selected_rows = st.multiselect(
                     "Select note to edit",
-                    options=filtered_df['id'].tolist(),
-                    format_func=lambda x: f"ID {x}: {filtered_df[filtered_df['id']==x]['note_name'].iloc[0][:30]}...",
+                    options=list(note_names),
+                    format_func=lambda x: f"ID {x}: {note_names[x][:30]}...",
                     max_selections=1
                 )
                 
@@ -351,8 +544,8 @@ def main():
             with col2:
                 delete_id = st.selectbox(
                     "Select note to delete",
-                    options=[None] + filtered_df['id'].tolist(),
-                    format_func=lambda x: "Choose note..." if x is None else f"ID {x}: {filtered_df[filtered_df['id']==x]['note_name'].iloc[0][:20]}...",
+                    options=[None, *note_names],
+                    format_func=lambda x: "Choose note..." if x is None else f"ID {x}: {note_names[x][:20]}...",
                 )
                 
                 if delete_id:
@@ -374,7 +567,9 @@ def main():
             # Export functionality
             with col3:
                 if st.button("📥 Export CSV"):
-                    csv = filtered_df.to_csv(index=False)
+                    # The paginated view exports every matching note, not just the page
+                    export_df = load_notes_page(search_term, show_only_with_url) if paginated else filtered_df
+                    csv = export_df.to_csv(index=False)
                     st.download_button(
                         label="💾 Download CSV",
                         data=csv,
@@ -385,7 +580,7 @@ def main():
             # Refresh data
             with col4:
                 if st.button("🔄 Refresh Data"):
-                    load_notes.clear()
+                    get_notes_cache(DATABASE_USER).invalidate()
                     st.rerun()
         
         else: